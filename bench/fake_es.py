@@ -0,0 +1,114 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from bench.fake_gofast import QuietServer
+
+
+class FakeElasticsearch:
+    """
+    模拟 aml_converter 用到的 Elasticsearch 接口：bulk 部分更新、读取和修改索引设置、refresh，
+    基准测试不会把更新发送到真实的 ES
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        # 索引 -> 文档ID -> 合并后的文档
+        self.documents = {}
+        # 索引 -> 设置
+        self.settings = {}
+        self.bulk_requests = 0
+        self._lock = threading.Lock()
+        self.server = QuietServer((host, port), self._handler())
+        self.host = host
+        self.port = self.server.server_address[1]
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name='fake-es', daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _bulk(self, lines: list) -> list:
+        """执行 bulk 请求中的 update 操作，返回每个文档的结果"""
+        items = []
+        with self._lock:
+            self.bulk_requests += 1
+            for action_line, doc_line in zip(lines[::2], lines[1::2]):
+                action = json.loads(action_line)
+                op, meta = next(iter(action.items()))
+                doc = json.loads(doc_line).get('doc', {})
+                self.documents.setdefault(meta['_index'], {}).setdefault(str(meta['_id']), {}).update(doc)
+                items.append({op: {'_index': meta['_index'], '_id': meta['_id'], 'result': 'updated',
+                                   'status': 200}})
+        return items
+
+    def _handler(self):
+        es = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = self.parts()
+                if not parts:
+                    # 7.14 之后的客户端在第一次请求前检查服务端是否为 Elasticsearch
+                    self.respond({'version': {'number': '7.17.0', 'build_flavor': 'default'},
+                                  'tagline': 'You Know, for Search'})
+                elif len(parts) >= 2 and parts[1] == '_settings':
+                    with es._lock:
+                        settings = dict(es.settings.get(parts[0], {}))
+                    self.respond({parts[0]: {'settings': {'index': settings}}})
+                else:
+                    self.respond({'error': 'not found'}, 404)
+
+            def do_PUT(self):
+                parts = self.parts()
+                body = self.read_body()
+                if len(parts) >= 2 and parts[1] == '_settings':
+                    settings = json.loads(body or b'{}').get('index', {})
+                    with es._lock:
+                        es.settings.setdefault(parts[0], {}).update(settings)
+                    self.respond({'acknowledged': True})
+                elif parts and parts[-1] == '_bulk':
+                    self.bulk(body)
+                else:
+                    self.respond({'error': 'not found'}, 404)
+
+            def do_POST(self):
+                parts = self.parts()
+                body = self.read_body()
+                if parts and parts[-1] == '_bulk':
+                    self.bulk(body)
+                elif parts and parts[-1] == '_refresh':
+                    self.respond({'_shards': {'total': 1, 'successful': 1, 'failed': 0}})
+                else:
+                    self.respond({'error': 'not found'}, 404)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('X-Elastic-Product', 'Elasticsearch')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def parts(self) -> list:
+                return [part for part in urlsplit(self.path).path.split('/') if part]
+
+            def read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def bulk(self, body: bytes) -> None:
+                lines = [line for line in body.decode('utf-8').splitlines() if line.strip()]
+                self.respond({'took': 1, 'errors': False, 'items': es._bulk(lines)})
+
+            def respond(self, data: dict, status: int = 200) -> None:
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('X-Elastic-Product', 'Elasticsearch')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
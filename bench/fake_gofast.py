@@ -0,0 +1,152 @@
+import hashlib
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from bench.faults import Faults
+
+BLOCK_SIZE = 64 * 1024
+
+
+class FakeFile:
+    """按种子生成的文件内容，不占用磁盘和内存，只保存一个 64KB 的数据块"""
+
+    def __init__(self, size: int, seed: str):
+        self.size = size
+        self.block = hashlib.sha256(seed.encode('utf-8')).digest() * (BLOCK_SIZE // 32)
+        self._md5 = None
+
+    def chunks(self, start: int = 0, end: Optional[int] = None):
+        """产生 [start, end] 范围内的内容"""
+        end = self.size - 1 if end is None else end
+        position = start
+        while position <= end:
+            offset = position % BLOCK_SIZE
+            size = min(BLOCK_SIZE - offset, end - position + 1)
+            yield self.block[offset:offset + size]
+            position += size
+
+    @property
+    def md5(self) -> str:
+        """文件内容的 MD5，第一次使用时计算"""
+        if self._md5 is None:
+            digest = hashlib.md5()
+            for chunk in self.chunks():
+                digest.update(chunk)
+            self._md5 = digest.hexdigest()
+        return self._md5
+
+
+class Latency:
+    """模拟服务端处理延迟：base 秒，上下浮动 jitter 比例"""
+
+    def __init__(self, base: float = 0, jitter: float = 0):
+        self.base = base
+        self.jitter = jitter
+
+    def sleep(self) -> None:
+        if self.base > 0:
+            time.sleep(self.base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+class QuietServer(ThreadingHTTPServer):
+    """客户端提前断开连接是故障注入的正常结果，不打印异常"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class FakeGofast:
+    """模拟 gofast 文件服务，支持 Range 请求和 keep-alive"""
+
+    def __init__(self, latency: Optional[Latency] = None, host: str = '127.0.0.1', port: int = 0,
+                 faults: Optional[Faults] = None):
+        self.latency = latency or Latency()
+        self.faults = faults or Faults()
+        self.files = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.server = QuietServer((host, port), self._handler())
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+
+    def add(self, path: str, size: int) -> str:
+        """注册文件，path 可以带查询参数，返回完整的下载地址"""
+        self.files[path] = FakeFile(size, path)
+        return self.url + path
+
+    def file(self, url: str) -> Optional[FakeFile]:
+        return self.files.get(url[len(self.url):] if url.startswith(self.url) else url)
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name='fake-gofast', daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, size: int) -> None:
+        with self._lock:
+            self.bytes_sent += size
+
+    def _handler(self):
+        gofast = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with gofast._lock:
+                    gofast.requests += 1
+                file = gofast.files.get(self.path)
+                gofast.latency.sleep()
+                if file is None:
+                    self.send_error(404)
+                    return
+                fault = gofast.faults.pick('gofast', ('spike', 'reset', 'error', 'truncate'))
+                if fault == 'spike':
+                    gofast.faults.spike()
+                elif fault == 'reset':
+                    self.close_connection = True
+                    Faults.reset(self.connection)
+                    return
+                elif fault == 'error':
+                    self.close_connection = True
+                    self.send_error(502)
+                    return
+                start, end = 0, file.size - 1
+                match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                    if start > end:
+                        self.send_error(416)
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{file.size}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                if fault == 'truncate':
+                    # 只发送一半后断开，客户端读到的长度小于 Content-Length
+                    end = start + (end - start + 1) // 2 - 1
+                    self.close_connection = True
+                for chunk in file.chunks(start, end):
+                    self.wfile.write(chunk)
+                    gofast._count(len(chunk))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+from typing import Optional, Tuple
+
+from bench.faults import Faults
+
+
+class FakeCursor:
+    """pymysql 游标的最小兼容实现，把 %s 占位符转换为 SQLite 的 ?"""
+
+    def __init__(self, connection: 'FakeConnection'):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _sql(sql: str) -> str:
+        # pymysql 格式化后 %% 变为 %
+        return sql.replace('%s', '?').replace('%%', '%')
+
+    def execute(self, sql: str, params: Tuple = ()) -> int:
+        self._connection.check()
+        if sql.startswith('SET SESSION'):
+            # MySQL 的会话变量在 SQLite 中没有对应
+            return 0
+        self._cursor.execute(self._sql(sql), tuple(params))
+        return self._cursor.rowcount
+
+    def executemany(self, sql: str, params_list) -> int:
+        self._connection.check()
+        self._cursor.executemany(self._sql(sql), [tuple(params) for params in params_list])
+        return self._cursor.rowcount
+
+    def fetchall(self) -> Tuple[Tuple, ...]:
+        return tuple(self._cursor.fetchall())
+
+    def fetchmany(self, size: int) -> Tuple[Tuple, ...]:
+        return tuple(self._cursor.fetchmany(size))
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class FakeConnection:
+    """pymysql 连接的最小兼容实现，每个 database 对应一个 SQLite 文件"""
+
+    def __init__(self, path: str, faults: Optional[Faults] = None):
+        self.raw = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.raw.execute('PRAGMA journal_mode=WAL')
+        self.faults = faults or Faults()
+        self.lost = False
+
+    def check(self) -> None:
+        """模拟连接在查询过程中断开，断开后未提交的事务回滚，之后的操作都失败"""
+        if not self.lost and self.faults.pick('mysql', ('drop',)):
+            self.lost = True
+            self.raw.rollback()
+        if self.lost:
+            import pymysql
+            raise pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query')
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def begin(self) -> None:
+        # sqlite3 在第一条写语句前自动开始事务
+        pass
+
+    def commit(self) -> None:
+        self.check()
+        self.raw.commit()
+
+    def rollback(self) -> None:
+        self.raw.rollback()
+
+    def ping(self, reconnect: bool = True) -> None:
+        pass
+
+    def close(self) -> None:
+        self.raw.close()
+
+
+class FakeMySQL:
+    """替换 utils.mysql_connector 中的 pymysql 模块，connect 返回 SQLite 连接"""
+
+    def __init__(self, directory: str, faults: Optional[Faults] = None):
+        self.directory = directory
+        self.faults = faults or Faults()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, database: str) -> str:
+        return os.path.join(self.directory, f'{database}.sqlite')
+
+    def connect(self, database: str = '', **kwargs) -> FakeConnection:
+        return FakeConnection(self.path(database), self.faults)
+
+    def install(self) -> None:
+        """让 Database.connect 连接到本地 SQLite"""
+        import utils.mysql_connector
+        utils.mysql_connector.pymysql = self
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Optional
+
+from bench.fake_gofast import Latency, QuietServer
+from bench.faults import Faults
+
+
+class UploadRecord:
+    """一次上传收到的文件"""
+
+    def __init__(self, space_id: str, path: str, file_name: str, size: int, md5: str):
+        self.space_id = space_id
+        self.path = path
+        self.file_name = file_name
+        self.size = size
+        self.md5 = md5
+
+
+class FakeUploadApi:
+    """模拟 /api/document/uploadFile 和 /api/document/client/uploadFile，流式解析 multipart 请求体并计算文件 MD5"""
+
+    UPLOAD_PATHS = ('/api/document/uploadFile', '/api/document/client/uploadFile')
+
+    def __init__(self, latency: Optional[Latency] = None, host: str = '127.0.0.1', port: int = 0,
+                 faults: Optional[Faults] = None):
+        self.latency = latency or Latency()
+        self.faults = faults or Faults()
+        self.records = []
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self.server = QuietServer((host, port), self._handler())
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+
+    @property
+    def upload_api(self) -> str:
+        return self.url + self.UPLOAD_PATHS[0]
+
+    @property
+    def client_api(self) -> str:
+        return self.url + self.UPLOAD_PATHS[1]
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name='fake-upload', daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _record(self, record: UploadRecord) -> int:
+        with self._lock:
+            self.records.append(record)
+            self.bytes_received += record.size
+            return len(self.records)
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                if self.path not in api.UPLOAD_PATHS:
+                    self.close_connection = True
+                    self.send_error(404)
+                    return
+                match = re.search(r'boundary=([^;]+)', self.headers.get('Content-Type', ''))
+                if not match:
+                    self.close_connection = True
+                    self.send_error(400)
+                    return
+                record = self.read_multipart(match.group(1).strip('"').encode('utf-8'))
+                api.latency.sleep()
+                # 请求体已经读完，故障发生在服务端处理阶段，客户端无法确定是否上传成功
+                fault = api.faults.pick('upload', ('spike', 'reset', 'error'))
+                if fault == 'spike':
+                    api.faults.spike()
+                elif fault == 'reset':
+                    self.close_connection = True
+                    Faults.reset(self.connection)
+                    return
+                elif fault == 'error':
+                    self.close_connection = True
+                    self.send_error(502)
+                    return
+                self.respond(record)
+
+            def respond(self, record: UploadRecord) -> None:
+                """返回与上传接口相同结构的响应"""
+                file_id = api._record(record)
+                body = json.dumps({'code': 200, 'data': {
+                    'id': file_id, 'fileName': record.file_name, 'path': record.path,
+                    'spaceId': record.space_id, 'size': record.size, 'md5': record.md5,
+                }}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def body_chunks(self):
+                """按 Content-Length 或 chunked 读取请求体"""
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0], 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return
+                        yield self.rfile.read(size)
+                        self.rfile.readline()
+                remaining = int(self.headers.get('Content-Length', 0))
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        return
+                    remaining -= len(chunk)
+                    yield chunk
+
+            def read_multipart(self, boundary: bytes) -> UploadRecord:
+                """解析表单字段，文件部分边读边计算 MD5，不在内存中保留整个文件"""
+                tail = b'\r\n--' + boundary + b'--'
+                buffer = b''
+                head = None
+                digest = hashlib.md5()
+                size = 0
+                for chunk in self.body_chunks():
+                    buffer += chunk
+                    if head is None:
+                        # 文件部分的头在 filename= 之后的第一个空行结束
+                        position = buffer.find(b'filename=')
+                        end = buffer.find(b'\r\n\r\n', position) if position >= 0 else -1
+                        if end < 0:
+                            continue
+                        head, buffer = buffer[:end], buffer[end + 4:]
+                    # 保留可能属于结尾分隔符的部分
+                    keep = len(tail) + 2
+                    if len(buffer) > keep:
+                        digest.update(buffer[:-keep])
+                        size += len(buffer) - keep
+                        buffer = buffer[-keep:]
+                end = buffer.rfind(tail)
+                if end >= 0:
+                    buffer = buffer[:end]
+                digest.update(buffer)
+                size += len(buffer)
+
+                text = (head or b'').decode('utf-8', 'replace')
+                fields = dict(re.findall(r'name="([^"]+)"(?:; filename="[^"]*")?\r\n(?:[^\r\n]+\r\n)*\r\n([^\r\n]*)',
+                                         text))
+                file_name = re.search(r'filename="([^"]*)"', text)
+                return UploadRecord(fields.get('spaceId', ''), fields.get('path', ''),
+                                    file_name.group(1) if file_name else '', size, digest.hexdigest())
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,46 @@
+import random
+import socket
+import struct
+import threading
+import time
+from typing import Iterable, Optional
+
+
+class Faults:
+    """
+    按概率注入的故障，rates 为 故障类型 -> 每个请求的触发概率：
+    spike 延迟 spike_seconds 秒后正常处理，reset 直接重置连接，error 返回 502，
+    truncate 按完整长度发送响应头但只发送一半响应体，drop 断开 MySQL 连接
+    """
+
+    KINDS = ('spike', 'reset', 'error', 'truncate', 'drop')
+
+    def __init__(self, rates: Optional[dict] = None, spike_seconds: float = 2.0, seed: Optional[int] = None):
+        self.rates = {kind: 0.0 for kind in self.KINDS}
+        self.rates.update(rates or {})
+        self.spike_seconds = spike_seconds
+        self.enabled = True
+        self.counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def pick(self, target: str, kinds: Iterable[str]) -> Optional[str]:
+        """按概率选出本次请求要注入的故障，没有故障时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            for kind in kinds:
+                if self.rates[kind] and self._random.random() < self.rates[kind]:
+                    key = f'{target}.{kind}'
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                    return kind
+        return None
+
+    def spike(self) -> None:
+        time.sleep(self.spike_seconds)
+
+    @staticmethod
+    def reset(connection: socket.socket) -> None:
+        """设置 SO_LINGER 为 0 后关闭，对端收到 RST 而不是正常的 FIN"""
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        connection.close()
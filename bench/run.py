@@ -0,0 +1,198 @@
+"""
+本地基准测试：启动模拟的 gofast、上传接口和基于 SQLite 的 MySQL，按转换器统计 files/sec 和 MB/sec
+
+在仓库根目录执行，例如：
+    python -m bench.run --converters simulink_converter,video_converter --rows 500 \\
+        --sizes lognormal:1MB,1.0 --download-latency 0.02 --upload-latency 0.05 \\
+        --set converter.engine=asyncio --set converter.concurrency=64
+
+每个转换器在 --workdir/<name> 下使用独立的配置、数据库、检查点和临时文件
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import List, Optional
+
+import toml
+
+from bench.fake_es import FakeElasticsearch
+from bench.fake_gofast import FakeGofast, Latency
+from bench.fake_mysql import FakeMySQL
+from bench.fake_upload import FakeUploadApi
+from bench.faults import Faults
+from bench.scenarios import SCENARIOS, Check, Seeder, SizeDistribution
+from utils.sharding import load_converter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BenchResult:
+    """一个转换器的测试结果"""
+
+    def __init__(self, converter: str, rows: int, completed: int, correct: Optional[int], files: int,
+                 size: int, seconds: float, error: Optional[str] = None):
+        """
+        :param error: convert 中断时的异常，收到停止信号时为 'stopped'，正常结束时为 None
+        """
+        self.converter = converter
+        self.rows = rows
+        self.completed = completed
+        self.correct = correct
+        self.files = files
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files / self.seconds if self.seconds else 0
+
+    @property
+    def rows_per_sec(self) -> float:
+        """写回了上传结果的行数/秒"""
+        return self.completed / self.seconds if self.seconds else 0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.size / (1024 * 1024) / self.seconds if self.seconds else 0
+
+
+def parse_value(value: str):
+    """按 TOML 语法解析 --set 的值，解析失败时作为字符串"""
+    try:
+        return toml.loads(f'value = {value}')['value']
+    except Exception:
+        return value
+
+
+def write_config(workdir: str, gofast: FakeGofast, upload: FakeUploadApi, es: FakeElasticsearch,
+                 overrides: List[str]) -> None:
+    """以仓库的 conf/conf.toml 为基础，把外部服务替换为本地模拟服务，ES 的更新和索引设置不会发送到真实的集群"""
+    config = toml.load(os.path.join(ROOT, 'conf', 'conf.toml'))
+    config['fs']['fs_upload_api'] = upload.upload_api
+    config['fs']['fs_client_api'] = upload.client_api
+    config['gofast']['host'] = gofast.url
+    config['mysql'] = {'host': '127.0.0.1', 'port': 3306, 'user': 'bench', 'password': ''}
+    config.setdefault('es', {}).update({'host': es.host, 'port': es.port})
+    for override in overrides:
+        key, _, value = override.partition('=')
+        section = config
+        *sections, name = key.strip().split('.')
+        for part in sections:
+            section = section.setdefault(part, {})
+        section[name] = parse_value(value.strip())
+    os.makedirs(os.path.join(workdir, 'conf'), exist_ok=True)
+    with open(os.path.join(workdir, 'conf', 'conf.toml'), 'w') as file:
+        toml.dump(config, file)
+
+
+def verify(mysql: FakeMySQL, checks: List[Check], gofast: FakeGofast, md5: bool) -> (int, Optional[int]):
+    """统计写入了上传结果的行数，md5 为 True 时同时校验上传内容与源文件一致的行数"""
+    completed, correct = 0, 0
+    for check in checks:
+        connection = mysql.connect(check.database)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id, {check.column} FROM {check.table} WHERE {check.column} IS NOT NULL')
+            results = cursor.fetchall()
+        connection.close()
+        completed += len(results)
+        if md5:
+            for id, file_info in results:
+                source = gofast.file(check.expected[id])
+                if json.loads(file_info).get('md5') == source.md5:
+                    correct += 1
+    return completed, correct if md5 else None
+
+
+def run_converter(name: str, args, gofast: FakeGofast, upload: FakeUploadApi, es: FakeElasticsearch,
+                  faults: Optional[Faults] = None) -> BenchResult:
+    """
+    生成数据并运行一个转换器
+    :param faults: 与模拟服务共用的故障注入，只在转换器运行期间启用，生成数据和校验时关闭
+    """
+    faults = faults or Faults()
+    faults.enabled = False
+    workdir = os.path.abspath(os.path.join(args.workdir, name))
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    write_config(workdir, gofast, upload, es, args.set)
+    # utils.logger 只在第一次导入时创建 logs 目录
+    os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)
+    mysql = FakeMySQL(os.path.join(workdir, 'db'), faults)
+    mysql.install()
+    checks = SCENARIOS[name](Seeder(mysql, gofast, SizeDistribution(args.sizes, args.seed)), args.rows)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    files, size = len(upload.records), upload.bytes_received
+    try:
+        converter = load_converter(name)()
+        faults.enabled = True
+        start = time.monotonic()
+        # 中断的运行只完成了部分行，吞吐量不可比，需要在报告中标出
+        error = None if converter.convert() else converter.error or 'stopped'
+        seconds = time.monotonic() - start
+    finally:
+        faults.enabled = False
+        os.chdir(cwd)
+    completed, correct = verify(mysql, checks, gofast, args.verify)
+    return BenchResult(name, sum(len(check.expected) for check in checks), completed, correct,
+                       len(upload.records) - files, upload.bytes_received - size, seconds, error)
+
+
+def report(results: List[BenchResult]) -> str:
+    lines = [f'{"converter":<24}{"rows":>8}{"done":>8}{"correct":>9}{"files":>8}{"MB":>10}{"seconds":>10}'
+             f'{"files/s":>10}{"MB/s":>10}']
+    for result in results:
+        correct = '-' if result.correct is None else result.correct
+        lines.append(f'{result.converter:<24}{result.rows:>8}{result.completed:>8}{correct:>9}{result.files:>8}'
+                     f'{result.size / (1024 * 1024):>10.1f}{result.seconds:>10.2f}{result.files_per_sec:>10.1f}'
+                     f'{result.mb_per_sec:>10.2f}')
+    for result in results:
+        if result.error is not None:
+            lines.append(f'{result.converter} aborted: {result.error}')
+    return '\n'.join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='使用本地模拟服务对转换器做基准测试')
+    parser.add_argument('--converters', default='simulink_converter',
+                        help=f'逗号分隔的转换器名称，可选：{", ".join(SCENARIOS)}')
+    parser.add_argument('--rows', type=int, default=200, help='每个转换器生成的行数')
+    parser.add_argument('--sizes', default='lognormal:1MB,1.0',
+                        help='文件大小分布：fixed:4MB、uniform:1KB,10MB、lognormal:中位数,sigma、choice:10KB,1MB')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子，相同种子生成相同的数据')
+    parser.add_argument('--download-latency', type=float, default=0, help='gofast 每个请求的延迟（秒）')
+    parser.add_argument('--upload-latency', type=float, default=0, help='上传接口每个请求的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟上下浮动的比例')
+    parser.add_argument('--set', action='append', default=[],
+                        help='覆盖配置，例如 converter.engine=asyncio、http.pool_size=64，可重复')
+    parser.add_argument('--verify', action='store_true', help='校验上传内容的 MD5 与源文件一致')
+    parser.add_argument('--workdir', default='bench_runs', help='测试数据和临时文件目录')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    gofast = FakeGofast(Latency(args.download_latency, args.jitter))
+    upload = FakeUploadApi(Latency(args.upload_latency, args.jitter))
+    es = FakeElasticsearch()
+    gofast.start()
+    upload.start()
+    es.start()
+    try:
+        results = [run_converter(name.strip(), args, gofast, upload, es) for name in args.converters.split(',')]
+    finally:
+        gofast.stop()
+        upload.stop()
+        es.stop()
+    print(report(results))
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
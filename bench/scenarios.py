@@ -0,0 +1,210 @@
+import json
+import random
+import re
+from typing import Callable, Dict, List
+
+from bench.fake_gofast import FakeGofast
+from bench.fake_mysql import FakeMySQL
+
+UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """解析 512KB、4MB 这样的大小"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?B?)\s*', value.upper())
+    if not match:
+        raise ValueError(f'invalid size: {value}')
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+class SizeDistribution:
+    """
+    文件大小分布：
+    fixed:4MB、uniform:1KB,10MB、lognormal:1MB,1.5（中位数和 sigma）、choice:10KB,1MB,200MB
+    """
+
+    def __init__(self, spec: str, seed: int = 0):
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [arg for arg in args.split(',') if arg]
+        self.random = random.Random(seed)
+        if kind not in ('fixed', 'uniform', 'lognormal', 'choice'):
+            raise ValueError(f'unknown size distribution: {spec}')
+
+    def sample(self) -> int:
+        if self.kind == 'fixed':
+            return parse_size(self.args[0])
+        if self.kind == 'uniform':
+            return self.random.randint(parse_size(self.args[0]), parse_size(self.args[1]))
+        if self.kind == 'lognormal':
+            median = parse_size(self.args[0])
+            sigma = float(self.args[1]) if len(self.args) > 1 else 1.0
+            return max(1, int(self.random.lognormvariate(0, sigma) * median))
+        return parse_size(self.random.choice(self.args))
+
+
+class Check:
+    """迁移结束后检查一张表：column 中应写入上传结果，expected 为 行ID -> 源文件地址"""
+
+    def __init__(self, database: str, table: str, column: str, expected: Dict[int, str]):
+        self.database = database
+        self.table = table
+        self.column = column
+        self.expected = expected
+
+
+class Seeder:
+    """为转换器生成源表数据，并在模拟的 gofast 上注册对应的文件"""
+
+    def __init__(self, mysql: FakeMySQL, gofast: FakeGofast, sizes: SizeDistribution):
+        self.mysql = mysql
+        self.gofast = gofast
+        self.sizes = sizes
+        self._next_file_id = 1
+        self.create('adhere_mfs', 'CREATE TABLE IF NOT EXISTS t_origin_file (id INTEGER PRIMARY KEY, url TEXT)')
+
+    def create(self, database: str, *statements: str) -> None:
+        connection = self.mysql.connect(database)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        connection.commit()
+        connection.close()
+
+    def insert(self, database: str, table: str, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        connection = self.mysql.connect(database)
+        # 只插入前 len(rows[0]) 列，其余列（例如 update_time）使用默认值
+        columns = [column[0] for column in connection.raw.execute(f'SELECT * FROM {table} LIMIT 0').description]
+        columns = ', '.join(columns[:len(rows[0])])
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({", ".join(["%s"] * len(rows[0]))})', rows)
+        connection.commit()
+        connection.close()
+
+    def file(self, path: str) -> str:
+        """注册一个按分布取大小的文件，返回下载地址"""
+        return self.gofast.add(path, self.sizes.sample())
+
+    def origin_file(self, path: str) -> (int, str):
+        """注册文件并写入 t_origin_file，返回文件ID和下载地址"""
+        url = self.file(path)
+        file_id = self._next_file_id
+        self._next_file_id += 1
+        self.insert('adhere_mfs', 't_origin_file', [(file_id, url)])
+        return file_id, url
+
+
+# 源表的修改时间列，与 MySQL 的 DEFAULT CURRENT_TIMESTAMP 一致
+UPDATE_TIME = 'update_time TEXT DEFAULT CURRENT_TIMESTAMP'
+
+
+def seed_simulink(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('adhere_signal_mapping', 'CREATE TABLE t_simulink_file_info (id INTEGER PRIMARY KEY, file_id INTEGER, '
+                                           'file_name TEXT, simulink_file_info TEXT, ' + UPDATE_TIME + ')')
+    data, expected = [], {}
+    for id in range(1, rows + 1):
+        file_id, url = seeder.origin_file(f'/group1/models/{id}/model_{id}.slx')
+        data.append((id, file_id, f'model_{id}.slx', None))
+        expected[id] = url
+    seeder.insert('adhere_signal_mapping', 't_simulink_file_info', data)
+    return [Check('adhere_signal_mapping', 't_simulink_file_info', 'simulink_file_info', expected)]
+
+
+def seed_parse_file(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('adhere_testproject', 'CREATE TABLE t_parse_file (id INTEGER PRIMARY KEY, file_name TEXT, '
+                                        'file_source_id INTEGER, md5 TEXT, file_info TEXT, ' + UPDATE_TIME + ')')
+    data, expected = [], {}
+    for id in range(1, rows + 1):
+        file_id, url = seeder.origin_file(f'/group1/parse/{id}/parse_{id}.csv')
+        data.append((id, f'parse_{id}.csv', file_id, None, None))
+        expected[id] = url
+    seeder.insert('adhere_testproject', 't_parse_file', data)
+    return [Check('adhere_testproject', 't_parse_file', 'file_info', expected)]
+
+
+def seed_aml(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('adhere_share', 'CREATE TABLE t_orienlink_program (id INTEGER PRIMARY KEY, file_id INTEGER, '
+                                  'file_name TEXT, program_urls TEXT, space_id INTEGER, program_file_info TEXT, '
+                                  'upload_file_info TEXT)')
+    data, expected = [], {}
+    for id in range(1, rows + 1):
+        url = seeder.file(f'/group1/operator/{id}/program_{id}.py')
+        file_id, _ = seeder.origin_file(f'/group1/operator/{id}/attachment_{id}.zip')
+        data.append((id, file_id, f'attachment_{id}.zip', json.dumps([url]), 29, None, None))
+        expected[id] = url
+    seeder.insert('adhere_share', 't_orienlink_program', data)
+    return [Check('adhere_share', 't_orienlink_program', 'program_file_info', expected)]
+
+
+def seed_arrow(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('orienlink_batch_storage', 'CREATE TABLE t_arrow_file (id INTEGER PRIMARY KEY, origin_file_info TEXT, '
+                                             'channel_config_url TEXT, arrow_file_info TEXT, space_id INTEGER, '
+                                             'origin_file_name TEXT, ol_origin_file_info TEXT, '
+                                             'ol_arrow_file_info TEXT, ' + UPDATE_TIME + ')')
+    data, expected = [], {}
+    for id in range(1, rows + 1):
+        origin_url = seeder.file(f'/group1/originalData/{id}/origin_{id}.dat')
+        arrow_url = seeder.file(f'/group1/arrow?name=arrow_{id}.arrow&id={id}')
+        data.append((id, json.dumps({'path': origin_url}), None, json.dumps({'path': arrow_url}), 29, None, None,
+                     None))
+        expected[id] = origin_url
+    seeder.insert('orienlink_batch_storage', 't_arrow_file', data)
+    return [Check('orienlink_batch_storage', 't_arrow_file', 'ol_origin_file_info', expected)]
+
+
+def seed_success_file(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('orienlink_batch_storage', 'CREATE TABLE t_success_file (id INTEGER PRIMARY KEY, '
+                                             'origin_file_id INTEGER, file_name TEXT, origin_file_info TEXT, '
+                                             + UPDATE_TIME + ')')
+    data, expected = [], {}
+    file_id, url = None, None
+    for id in range(1, rows + 1):
+        # 每个源文件对应 1~3 行
+        if file_id is None or seeder.sizes.random.random() < 0.5:
+            file_id, url = seeder.origin_file(f'/group1/originalData/success/{id}/success_{id}.dat')
+        data.append((id, file_id, f'success_{file_id}.dat', None))
+        expected[id] = url
+    seeder.insert('orienlink_batch_storage', 't_success_file', data)
+    return [Check('orienlink_batch_storage', 't_success_file', 'origin_file_info', expected)]
+
+
+def seed_video(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('orienlink_batch_storage', 'CREATE TABLE t_time_sequence_object (id INTEGER PRIMARY KEY, '
+                                             'poster_url TEXT, file_path TEXT, space_id INTEGER, '
+                                             'post_file_info TEXT, video_file_info TEXT, ' + UPDATE_TIME + ')')
+    data, expected = [], {}
+    for id in range(1, rows + 1):
+        # 视频地址以 /gofast 开头，由转换器替换为 gofast.host
+        poster_url = seeder.file(f'/group1/video/{id}/poster_{id}.jpg')
+        video_url = seeder.file(f'/group1/video/{id}/video_{id}.mp4')
+        data.append((id, poster_url.replace(seeder.gofast.url, '/gofast'),
+                     video_url.replace(seeder.gofast.url, '/gofast'), 29, None, None))
+        expected[id] = video_url
+    seeder.insert('orienlink_batch_storage', 't_time_sequence_object', data)
+    return [Check('orienlink_batch_storage', 't_time_sequence_object', 'video_file_info', expected)]
+
+
+def seed_view(seeder: Seeder, rows: int) -> List[Check]:
+    seeder.create('orienlink_batch_storage', 'CREATE TABLE t_node_tree (id INTEGER PRIMARY KEY, template_url TEXT, '
+                                             'space_id INTEGER, file_info TEXT, ' + UPDATE_TIME + ')')
+    data, expected = [], {}
+    for id in range(1, rows + 1):
+        url = seeder.file(f'/group1/dataview/{id}/view_{id}.json')
+        data.append((id, url, 29, None))
+        expected[id] = url
+    seeder.insert('orienlink_batch_storage', 't_node_tree', data)
+    return [Check('orienlink_batch_storage', 't_node_tree', 'file_info', expected)]
+
+
+# 转换器名称 -> 生成源表数据的函数
+SCENARIOS: Dict[str, Callable[[Seeder, int], List[Check]]] = {
+    'simulink_converter': seed_simulink,
+    'parse_file_converter': seed_parse_file,
+    'aml_converter': seed_aml,
+    'arrow_converter': seed_arrow,
+    'success_file_converter': seed_success_file,
+    'video_converter': seed_video,
+    'view_converter': seed_view,
+}
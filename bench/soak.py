@@ -0,0 +1,140 @@
+"""
+故障注入的长时间运行测试：在 bench.run 的模拟服务上按概率注入延迟尖峰、连接重置、502、
+响应体截断和 MySQL 断开，反复运行同一个转换器，报告吞吐量（完成的行数/秒）的下降、
+已完成行的正确性以及最终的内存、文件描述符和线程数
+
+在仓库根目录执行，例如：
+    python -m bench.soak --converter video_converter --duration 1800 --rows 200 \\
+        --spike-rate 0.02 --reset-rate 0.01 --error-rate 0.02 --truncate-rate 0.02 --mysql-drop-rate 0.0005
+
+第一轮不注入故障，作为吞吐量的基准
+"""
+import argparse
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import List
+
+from bench.fake_es import FakeElasticsearch
+from bench.fake_gofast import FakeGofast, Latency
+from bench.fake_upload import FakeUploadApi
+from bench.faults import Faults
+from bench.run import BenchResult, run_converter
+from bench.scenarios import SCENARIOS
+
+
+class Footprint:
+    """进程的内存、文件描述符和线程数"""
+
+    def __init__(self):
+        self.rss = self._rss()
+        self.fds = len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else -1
+        self.threads = threading.active_count()
+
+    @staticmethod
+    def _rss() -> int:
+        """当前常驻内存（字节），不支持 /proc 的平台返回 -1"""
+        try:
+            with open('/proc/self/status') as file:
+                for line in file:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return -1
+
+    def __str__(self):
+        return f'rss={self.rss / (1024 * 1024):.1f}MB fds={self.fds} threads={self.threads}'
+
+
+def summarize(baseline: BenchResult, rounds: List[BenchResult], start: Footprint, end: Footprint,
+              faults: Faults) -> str:
+    rows = sum(result.rows for result in rounds)
+    completed = sum(result.completed for result in rounds)
+    correct = sum(result.correct or 0 for result in rounds)
+    rows_per_sec = completed / max(sum(result.seconds for result in rounds), 1e-9)
+    half = max(len(rounds) // 2, 1)
+    first = sum(result.rows_per_sec for result in rounds[:half]) / half
+    last = sum(result.rows_per_sec for result in rounds[-half:]) / half
+    degradation = (1 - rows_per_sec / baseline.rows_per_sec) * 100 if baseline.rows_per_sec else 0
+    aborted = [(index, result.error) for index, result in enumerate(rounds, 1) if result.error is not None]
+    lines = [
+        f'baseline: {baseline.rows_per_sec:.1f} rows/s, {baseline.files_per_sec:.1f} files/s, '
+        f'{baseline.mb_per_sec:.2f} MB/s' + (f' (aborted: {baseline.error})' if baseline.error else ''),
+        f'faulty rounds: {len(rounds)}, {rows_per_sec:.1f} rows/s ({degradation:.1f}% below baseline)',
+        f'first half {first:.1f} rows/s, second half {last:.1f} rows/s',
+        f'rows: {rows}, completed: {completed}, not completed: {rows - completed}, '
+        f'corrupted: {completed - correct}',
+        f'aborted rounds: {len(aborted)}' + ''.join(f'\n  round {index}: {error}' for index, error in aborted),
+        f'injected: {", ".join(f"{key}={count}" for key, count in sorted(faults.counts.items())) or "none"}',
+        f'footprint after baseline: {start}',
+        f'footprint at end:         {end}',
+    ]
+    return '\n'.join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='注入故障并长时间运行转换器')
+    parser.add_argument('--converter', default='simulink_converter', help=f'可选：{", ".join(SCENARIOS)}')
+    parser.add_argument('--duration', type=float, default=600, help='运行的总时间（秒），至少运行一轮')
+    parser.add_argument('--rows', type=int, default=200, help='每一轮生成的行数')
+    parser.add_argument('--sizes', default='lognormal:256KB,1.0', help='文件大小分布，格式同 bench.run')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--download-latency', type=float, default=0.005, help='gofast 每个请求的延迟（秒）')
+    parser.add_argument('--upload-latency', type=float, default=0.01, help='上传接口每个请求的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟上下浮动的比例')
+    parser.add_argument('--spike-rate', type=float, default=0.01, help='请求出现延迟尖峰的概率')
+    parser.add_argument('--spike-seconds', type=float, default=2.0, help='延迟尖峰的时长（秒）')
+    parser.add_argument('--reset-rate', type=float, default=0.005, help='连接被重置的概率')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='返回 502 的概率')
+    parser.add_argument('--truncate-rate', type=float, default=0.01, help='gofast 响应体被截断的概率')
+    parser.add_argument('--mysql-drop-rate', type=float, default=0.0, help='每条 SQL 执行时 MySQL 连接断开的概率')
+    parser.add_argument('--set', action='append', default=[], help='覆盖配置，格式同 bench.run')
+    parser.add_argument('--workdir', default='bench_runs/soak', help='测试数据和临时文件目录')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    args.verify = True
+    faults = Faults({'spike': args.spike_rate, 'reset': args.reset_rate, 'error': args.error_rate,
+                     'truncate': args.truncate_rate, 'drop': args.mysql_drop_rate}, args.spike_seconds, args.seed)
+    gofast = FakeGofast(Latency(args.download_latency, args.jitter), faults=faults)
+    upload = FakeUploadApi(Latency(args.upload_latency, args.jitter), faults=faults)
+    es = FakeElasticsearch()
+    gofast.start()
+    upload.start()
+    es.start()
+    workdir = args.workdir
+    rounds = []
+    try:
+        args.workdir = os.path.join(workdir, 'baseline')
+        baseline = run_converter(args.converter, args, gofast, upload, es)
+        start = Footprint()
+        deadline = time.monotonic() + args.duration
+        while not rounds or time.monotonic() < deadline:
+            # 每一轮使用新的数据，清理上一轮的模拟文件和目录，避免测试工具本身占用的内存和磁盘增长
+            gofast.files.clear()
+            upload.records.clear()
+            shutil.rmtree(args.workdir, ignore_errors=True)
+            args.seed += 1
+            args.workdir = os.path.join(workdir, f'round_{len(rounds) + 1}')
+            result = run_converter(args.converter, args, gofast, upload, es, faults)
+            rounds.append(result)
+            print(f'round {len(rounds)}: {result.completed}/{result.rows} rows, {result.correct} correct, '
+                  f'{result.rows_per_sec:.1f} rows/s, {Footprint()}'
+                  + (f', aborted: {result.error}' if result.error else ''))
+        end = Footprint()
+    finally:
+        gofast.stop()
+        upload.stop()
+        es.stop()
+    print(summarize(baseline, rounds, start, end, faults))
+    if baseline.error or any(result.error for result in rounds):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,687 @@
+import asyncio
 import hashlib
+import os
+import shutil
+import signal
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tqdm import tqdm
 
 from utils.toml_reader import ConfigReader
-from utils.dfs_file_info import DFS
+from utils.dfs_file_info import DFS, ContentDigest
+from utils.http_session import SessionPool
+from utils.bandwidth import Bandwidth
+from utils.checkpoint import CheckpointJournal
+from utils.concurrency_limiter import AdaptiveLimiter
+from utils.metrics import Metrics
+from utils.sharding import Shard
+from utils.tracing import Tracer
+from utils.upload_cache import UploadCache
+from utils.watermark import Watermark
+from utils.mysql_connector import BatchWriter
 from utils.upload_file import FileUploader
 
 
+class TransferJob:
+    """一次 下载 -> 上传 的文件传输任务"""
+
+    def __init__(self, key: str, row_id: Any, download_path: str, space_id: int, file_name: str,
+                 upload_path: str, original: bool = False, url: Optional[str] = None,
+                 file_id: Optional[int] = None, md5: Optional[str] = None):
+        """
+        :param key: 任务在所属行中的标识，上传结果以该标识返回给 write_back
+        :param row_id: 所属行的ID，用于日志
+        :param download_path: 本地临时文件路径
+        :param space_id: 工作空间id
+        :param file_name: 上传时字段的名称
+        :param upload_path: 上传的目标目录
+        :param original: 是否使用原始文件上传接口
+        :param url: 下载地址，与 file_id 二选一
+        :param file_id: t_origin_file 中的文件ID，下载前解析为 url
+        :param md5: 源表中记录的文件内容MD5，已知时可以在下载前命中上传缓存
+        """
+        self.key = key
+        self.row_id = row_id
+        self.download_path = download_path
+        self.space_id = space_id
+        self.file_name = file_name
+        self.upload_path = upload_path
+        self.original = original
+        self.url = url
+        self.file_id = file_id
+        self.md5 = md5
+
+
 class AbstractConverter(ABC):
+    # 转换器名称，用于日志文件名和 [converter.<name>] 配置
+    name = 'converter'
+    # 进度条描述
+    desc = 'file sync'
+    # 源表和查询的列，第一列必须是主键 id
+    table = ''
+    columns = 'id'
+    # 分片运行时用于划分源表的整数列，需要一起处理的行必须落在同一个分片
+    shard_key = 'id'
+    # 写回上传结果的列，增量运行时只选择该列为空的行
+    target_column = None
+    # 行的修改时间列，增量运行时还会选择上次运行之后修改过的行；为 None 时只按 target_column 选择
+    update_column = 'update_time'
+    # 一行中的传输任务互不依赖时同时执行，一行的耗时为最慢的任务而不是所有任务之和
+    parallel_jobs = False
 
     def __init__(self):
         self.config_reader = ConfigReader("conf/conf.toml")
         self.mysql_config = self.config_reader.get_mysql_config()
-        self.dfs = DFS()
+        self.converter_config = self.config_reader.get_converter_config(self.name)
+        self.workers = self.converter_config['workers']
+        self.engine = self.converter_config['engine']
+        self.concurrency = self.converter_config['concurrency']
+        self.streaming = self.converter_config['streaming']
+        self.sha256 = self.converter_config['sha256']
+        # 下载和上传共用按 host 划分的 keep-alive 连接池
+        self.http = SessionPool(**self.config_reader.get_http_config())
+        self.resolve_batch_size = self.converter_config['resolve_batch_size']
+        self.query_batch_size = self.converter_config['query_batch_size']
+        # gofast 和上传接口按 host 自适应调整并发数
+        self.limiter = AdaptiveLimiter(**self.config_reader.get_limiter_config())
+        # 所有下载和上传共用的带宽限制，可按时间段设置
+        self.bandwidth = Bandwidth(**self.config_reader.get_bandwidth_config())
+        self.dfs = DFS(self.http, self.converter_config['url_cache_size'],
+                       self.converter_config['download_chunk_size'], self.converter_config['range_threshold'],
+                       self.converter_config['range_parts'], self.converter_config['resume_attempts'], self.limiter,
+                       self.bandwidth)
         self.fs_config=self.config_reader.get_fs_api()
-        self.fs = FileUploader(self.fs_config.get('fs_upload_api'),self.fs_config.get('fs_client_api'))
+        self.fs = FileUploader(self.fs_config.get('fs_upload_api'),self.fs_config.get('fs_client_api'),
+                               self.fs_config.get('upload_chunk_size'), self.http, self.limiter,
+                               self.bandwidth)
+        self.checkpoint = None
+        # 各阶段的延迟、字节数和进行中的数量
+        self.metrics = self._create_metrics(self.name)
+        # 分片运行时只处理源表的一部分，查询条件在 convert 开始时确定
+        self.shard = None
+        self._condition = ('', ())
+        # 最近一次 convert 中断时的异常
+        self.error = None
+        # 传输失败的行数和源表主键
+        self.failed_rows = 0
+        self.failed_ids = []
+        # 相同内容上传到相同位置时复用之前的上传结果
+        self.upload_cache = None
+        if self.converter_config['upload_cache']:
+            self.upload_cache = UploadCache(self.converter_config['upload_cache_path'])
+        # 收到 SIGINT/SIGTERM 后不再提交新的行，等待进行中的行完成
+        self._stopping = threading.Event()
+        # parallel_jobs 时执行一行中其余传输任务的线程池，只在线程引擎运行期间存在
+        self._job_pool = None
+        # convert 期间的批量写入器，等待传输结果时按 commit_interval 定期提交
+        self._writer = None
+
+    def _create_metrics(self, label: str, port_offset: int = 0) -> Metrics:
+        """
+        按配置创建指标和 trace，label 用于文件名
+        :param port_offset: 指标端口的偏移，分片运行时每个分片进程使用 port + 分片序号，避免绑定同一个端口
+        """
+        trace_config = self.config_reader.get_trace_config(label)
+        tracer = Tracer(trace_config['path']) if trace_config['enabled'] else None
+        metrics_config = self.config_reader.get_metrics_config(label)
+        if metrics_config['port']:
+            metrics_config['port'] += port_offset
+        return Metrics(label, tracer=tracer, **metrics_config)
+
+    def query_rows(self, connection) -> Iterable:
+        """按主键分页流式查询需要迁移的行"""
+        where, params = self._condition
+        return self.db.iter_query(connection, self.columns, self.table, where, params,
+                                  batch_size=self.query_batch_size)
+
+    def count_rows(self, connection) -> int:
+        """需要迁移的行数，用于进度条"""
+        return self.db.count(connection, self.table, *self._condition)
 
     @abstractmethod
-    def convert(self):
+    def build_jobs(self, row) -> Optional[List[TransferJob]]:
+        """生成一行需要执行的传输任务，返回 None 表示跳过该行"""
+        pass
+
+    @abstractmethod
+    def write_back(self, writer: BatchWriter, row, file_infos: Dict[str, dict]) -> None:
+        """
+        将上传结果通过 writer 写回数据库，只在主线程中调用
+        更新语句中设置 update_time = update_time，迁移不改变行的修改时间，增量运行时不会再次选中这些行
+        """
+        pass
+
+    @staticmethod
+    def row_size(row) -> int:
+        """一行在进度条中所占的数量"""
+        return 1
+
+    @staticmethod
+    def row_ids(row) -> List[Any]:
+        """一行对应的源表主键，用于检查点"""
+        return [row[0]]
+
+    @staticmethod
+    def file_ids(row) -> List[int]:
+        """一行中需要从 t_origin_file 解析URL的文件ID，在传输前按批查询"""
+        return []
+
+    def convert(self, shard: Optional[Shard] = None, progress: Optional[Callable[[int], Any]] = None) -> bool:
+        """
+        执行迁移
+        :param shard: 只处理源表的一个分片，检查点、指标和 trace 文件按分片区分
+        :param progress: 根据总行数创建进度条的函数，默认使用 tqdm
+        :return: 所有行都已处理时返回 True；因异常中断（原因记录在 error 中）或收到停止信号时返回 False
+        """
+        self.error = None
+        label = self.name
+        self._condition = ('', ())
+        if shard is not None:
+            self.shard = shard
+            label = f'{self.name}.{shard}'
+            self.metrics = self._create_metrics(label, shard.index)
+        connection = self.db.connect()
+        watermark = None
+        # 更新语句批量执行并定期提交，中断时已完成的行不会被回滚；检查点随数据库一起提交
+        writer = BatchWriter(connection, self.converter_config['commit_batch_size'],
+                             self.converter_config['commit_interval'], self._on_commit)
+        self._writer = writer
+        previous_handlers = {sig: signal.signal(sig, self._request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+        # 连接建立之后的所有步骤都在 try 中执行，任何一步失败都会恢复信号处理并关闭连接
+        with ExitStack() as stack:
+            try:
+                if shard is not None:
+                    self._condition = shard.condition(self.db, connection, self.table, self.shard_key)
+                if self.converter_config['checkpoint']:
+                    self.checkpoint = CheckpointJournal(
+                        os.path.join(self.converter_config['checkpoint_dir'], f'{label}.sqlite'))
+                if self.converter_config['incremental']:
+                    watermark = Watermark(
+                        os.path.join(self.converter_config['checkpoint_dir'], f'{label}.watermark.json'))
+                    # 使用数据库的时间，与 update_time 的时钟一致
+                    started = str(self.db.query(connection, 'SELECT CURRENT_TIMESTAMP')[0][0])
+                    self._condition = self._incremental_condition(*watermark.load())
+                self.metrics.start()
+
+                total = self.count_rows(connection)
+                pbar = stack.enter_context(tqdm(total=total, desc=self.desc, unit="file") if progress is None
+                                           else progress(total))
+                connection.begin()  # 开始事务
+                rows = self._pending_rows(self.metrics.timed_iter('query', self.query_rows(connection)), pbar)
+                self.run_pool(rows, lambda row, file_infos: self._write_back(writer, row, file_infos), pbar)
+                # 提交剩余的更新
+                writer.flush()
+                if watermark is not None and not self._stopping.is_set():
+                    # 所有选中的行都已处理，下次只需要处理本次开始之后修改的行；失败的行中写回列为空的仍会被选中，
+                    # 已经迁移过的需要单独记录；检查点不再需要，否则之后被修改的行会因为已经完成而被跳过
+                    watermark.save(started, self._migrated_ids(connection, self.failed_ids))
+                    if self.checkpoint:
+                        self.checkpoint.clear()
+            except Exception as e:
+                self.logger.error(f"Exception occurred during conversion: {e}", exc_info=True)
+                self.error = repr(e)
+                try:
+                    # 提交已经完成的行
+                    writer.flush()
+                except Exception as flush_error:
+                    # 提交失败时回滚未提交的批次并记录日志
+                    self.logger.error(f"Failed to flush pending updates: {flush_error}")
+                    connection.rollback()
+                    if self.checkpoint:
+                        self.checkpoint.rollback()
+            finally:
+                self._writer = None
+                for sig, handler in previous_handlers.items():
+                    signal.signal(sig, handler)
+                connection.close()
+                self.http.close()
+                if self.checkpoint:
+                    self.checkpoint.close()
+                if self.upload_cache:
+                    self.upload_cache.close()
+                summary = self.metrics.stop()
+                if summary:
+                    print(summary)
+        return self.error is None and not self._stopping.is_set()
+
+    def _incremental_condition(self, update_time: Optional[str], retry_ids: List[Any]) -> Tuple[str, tuple]:
+        """
+        在分片条件的基础上只选择 target_column 为空、update_time 之后修改过，或上次迁移失败的行
+        :param retry_ids: 上次运行中失败、但之前已经迁移过（写回列不为空）的行
+        """
+        if not self.target_column:
+            raise ValueError(f'{self.name} does not support incremental mode')
+        condition = f'{self.target_column} IS NULL'
+        params = ()
+        if update_time and self.update_column:
+            condition += f' OR {self.update_column} >= %s'
+            params = (update_time,)
+        if retry_ids:
+            condition += f' OR id IN ({", ".join(["%s"] * len(retry_ids))})'
+            params += tuple(retry_ids)
+        where, shard_params = self._condition
+        if where:
+            return f'({where}) AND ({condition})', shard_params + params
+        return condition, params
+
+    def _migrated_ids(self, connection, ids: List[Any], batch_size: int = 1000) -> List[Any]:
+        """ids 中写回列不为空的行，这些行下次不会因为写回列为空而被选中"""
+        migrated = []
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            migrated.extend(row[0] for row in self.db.query(
+                connection, f'SELECT id FROM {self.table} WHERE id IN ({", ".join(["%s"] * len(batch))}) '
+                            f'AND {self.target_column} IS NOT NULL', tuple(batch)))
+        return migrated
+
+    def _row_failed(self, row) -> None:
+        """记录失败的行"""
+        self.failed_rows += self.row_size(row)
+        self.failed_ids.extend(self.row_ids(row))
+
+    def _on_commit(self) -> None:
+        """数据库每次提交后提交检查点"""
+        if self.checkpoint:
+            self.checkpoint.commit()
+        self.after_commit()
+
+    def after_commit(self) -> None:
+        """数据库每次提交后调用，子类可以在这里提交随写回产生的其他更新"""
         pass
 
+    def _request_stop(self, signum, frame) -> None:
+        """第一次收到信号时停止提交新的行，再次收到时立即中断"""
+        if self._stopping.is_set():
+            raise KeyboardInterrupt
+        print(f"Received signal {signum}, waiting for in-flight rows to finish")
+        self._stopping.set()
+
+    def _pending_rows(self, rows: Iterable, pbar) -> Iterable:
+        """跳过检查点中已完成的行并预先解析文件URL，收到停止信号后不再产生新的行"""
+        for row in self._prefetched(self._unfinished(rows, pbar)):
+            if self._stopping.is_set():
+                return
+            yield row
+
+    def _unfinished(self, rows: Iterable, pbar) -> Iterable:
+        """过滤掉检查点中已经完成的行"""
+        for row in rows:
+            if self.checkpoint and all(self.checkpoint.is_done(row_id) for row_id in self.row_ids(row)):
+                pbar.update(self.row_size(row))
+                continue
+            yield row
+
+    def _write_back(self, writer: BatchWriter, row, file_infos: Dict[str, dict]) -> None:
+        """写回数据库并记录检查点"""
+        with self.metrics.stage('write_back', self._trace_id(row)):
+            self.write_back(writer, row, file_infos)
+        if self.checkpoint:
+            for row_id in self.row_ids(row):
+                self.checkpoint.mark(row_id, file_infos)
+
+    def _trace_id(self, row) -> Any:
+        """trace 中标记行的ID，一条记录对应多行时为ID列表"""
+        ids = self.row_ids(row)
+        return ids[0] if len(ids) == 1 else ids
+
+    def run_pool(self, rows: Iterable, write_back, pbar) -> None:
+        """
+        按配置的传输引擎执行所有行，engine = "asyncio" 时使用协程，否则使用线程池
+        :param rows: 需要处理的行
+        :param write_back: 写回函数，参数为 (row, file_infos)
+        :param pbar: 进度条
+        """
+        if self.engine == 'asyncio':
+            asyncio.run(self._run_async(rows, write_back, pbar))
+        else:
+            self._run_threads(rows, write_back, pbar)
+
+    def _run_threads(self, rows: Iterable, write_back, pbar) -> None:
+        """
+        使用线程池并发执行每一行的 下载 -> 上传，写回数据库只在当前线程中执行
+        :param rows: 需要处理的行
+        :param write_back: 写回函数，参数为 (row, file_infos)
+        :param pbar: 进度条
+        """
+        # 限制排队中的任务数量，避免一次性提交所有行
+        max_pending = self.workers * 2
+        pending = {}
+        # 一行中的其余任务使用单独的线程池，不会与等待它们的行任务争抢线程而死锁
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name) as executor, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f'{self.name}-job') as job_pool:
+            self._job_pool = job_pool if self.parallel_jobs else None
+            try:
+                for row in rows:
+                    pending[executor.submit(self.transfer_row, row)] = row
+                    if len(pending) >= max_pending:
+                        self._drain(pending, write_back, pbar)
+                while pending:
+                    self._drain(pending, write_back, pbar)
+            finally:
+                for future in pending:
+                    future.cancel()
+                self._job_pool = None
+
+    def _prefetched(self, rows: Iterable) -> Iterable:
+        """每 resolve_batch_size 行用一次 IN 查询解析文件URL，之后再交给传输任务"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.resolve_batch_size:
+                yield from self._prefetch(batch)
+                batch = []
+        yield from self._prefetch(batch)
+
+    def _prefetch(self, batch: List) -> List:
+        """批量解析一批行中的文件ID，结果进入 DFS 的URL缓存"""
+        file_ids = [file_id for row in batch for file_id in self.file_ids(row) if file_id]
+        if file_ids:
+            with self.metrics.stage('resolve_batch'):
+                self.dfs.get_urls_by_file_ids(file_ids)
+        return batch
+
+    def _drain(self, pending: dict, write_back, pbar) -> None:
+        """等待至少一个任务完成并写回结果，等待超过提交间隔时先提交已缓冲的更新"""
+        done, _ = wait(pending, timeout=self._flush_timeout(), return_when=FIRST_COMPLETED)
+        self._flush_if_due()
+        for future in done:
+            row = pending.pop(future)
+            file_infos = self._row_result(future, row)
+            if file_infos is not None:
+                write_back(row, file_infos)
+            else:
+                self._row_failed(row)
+            pbar.update(self.row_size(row))
+
+    def _flush_timeout(self) -> Optional[float]:
+        """等待传输结果的最长时间，没有待提交的更新时一直等待"""
+        return self._writer.flush_timeout() if self._writer is not None else None
+
+    def _flush_if_due(self) -> None:
+        if self._writer is not None:
+            self._writer.flush_if_due()
+
+    def _row_result(self, future, row) -> Optional[Dict[str, dict]]:
+        """取出一行的传输结果，异常只导致该行失败，不中断整个迁移"""
+        try:
+            return future.result()
+        except Exception as e:
+            self.logger.error(f"ID: {self._trace_id(row)}, transfer failed: {e!r}", exc_info=True)
+            return None
+
+    async def _run_async(self, rows: Iterable, write_back, pbar) -> None:
+        """在一个事件循环中同时执行最多 concurrency 行的传输，写回数据库在事件循环线程中执行"""
+        from utils.async_transfer import AsyncTransfer
+
+        pending = {}
+        http_config = self.config_reader.get_http_config()
+        # 一行的任务同时执行时每行需要的连接数加倍
+        limit = self.concurrency * 2 if self.parallel_jobs else self.concurrency
+        async with AsyncTransfer(self.fs_config.get('fs_upload_api'), self.fs_config.get('fs_client_api'),
+                                 limit, http_config['connect_timeout'],
+                                 http_config['read_timeout'], self.dfs.chunk_size, self.bandwidth,
+                                 self.dfs.resume_attempts, self.limiter) as transfer:
+            try:
+                for row in rows:
+                    pending[asyncio.ensure_future(self.transfer_row_async(transfer, row))] = row
+                    if len(pending) >= self.concurrency:
+                        await self._drain_async(pending, write_back, pbar)
+                while pending:
+                    await self._drain_async(pending, write_back, pbar)
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    async def _drain_async(self, pending: dict, write_back, pbar) -> None:
+        """等待至少一个协程完成并写回结果，等待超过提交间隔时先提交已缓冲的更新"""
+        done, _ = await asyncio.wait(pending, timeout=self._flush_timeout(), return_when=asyncio.FIRST_COMPLETED)
+        self._flush_if_due()
+        for task in done:
+            row = pending.pop(task)
+            file_infos = self._row_result(task, row)
+            if file_infos is not None:
+                write_back(row, file_infos)
+            else:
+                self._row_failed(row)
+            pbar.update(self.row_size(row))
+
+    def transfer_row(self, row) -> Optional[Dict[str, dict]]:
+        """执行一行的所有传输任务，任一任务失败则返回 None"""
+        with self.metrics.stage('row', self._trace_id(row)) as timer:
+            file_infos = self._transfer_jobs(row)
+            timer.error = file_infos is None
+        return file_infos
+
+    def _transfer_jobs(self, row) -> Optional[Dict[str, dict]]:
+        jobs = self.build_jobs(row)
+        if jobs is None:
+            return None
+        if self._job_pool is not None and len(jobs) > 1:
+            # 最后一个任务在当前线程执行，其余任务交给 job 线程池，全部结束后再返回
+            futures = [self._job_pool.submit(self.transfer_file, job) for job in jobs[:-1]]
+            try:
+                last = self.transfer_file(jobs[-1])
+            finally:
+                wait(futures)
+            return self._file_infos(jobs, [future.result() for future in futures] + [last])
+        file_infos = {}
+        for job in jobs:
+            file_info = self.transfer_file(job)
+            if file_info is None:
+                return None
+            file_infos[job.key] = file_info
+        return file_infos
+
+    @staticmethod
+    def _file_infos(jobs: List[TransferJob], results: List[Optional[dict]]) -> Optional[Dict[str, dict]]:
+        """合并同时执行的任务结果，任一任务失败则返回 None"""
+        if any(file_info is None for file_info in results):
+            return None
+        return {job.key: file_info for job, file_info in zip(jobs, results)}
+
+    async def transfer_row_async(self, transfer, row) -> Optional[Dict[str, dict]]:
+        """transfer_row 的协程版本，build_jobs 中可能有数据库查询，放到线程中执行"""
+        with self.metrics.stage('row', self._trace_id(row)) as timer:
+            file_infos = await self._transfer_jobs_async(transfer, row)
+            timer.error = file_infos is None
+        return file_infos
+
+    async def _transfer_jobs_async(self, transfer, row) -> Optional[Dict[str, dict]]:
+        loop = asyncio.get_running_loop()
+        jobs = await loop.run_in_executor(None, self.build_jobs, row)
+        if jobs is None:
+            return None
+        if self.parallel_jobs and len(jobs) > 1:
+            # 等待所有任务结束后再抛出异常，避免留下仍在写临时文件的任务
+            results = await asyncio.gather(*(self.transfer_file_async(transfer, job) for job in jobs),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            return self._file_infos(jobs, results)
+        file_infos = {}
+        for job in jobs:
+            file_info = await self.transfer_file_async(transfer, job)
+            if file_info is None:
+                return None
+            file_infos[job.key] = file_info
+        return file_infos
+
+    def transfer_file(self, job: TransferJob) -> Optional[dict]:
+        """下载并上传单个文件，返回上传后的文件信息"""
+        try:
+            url = self._resolve_url(job)
+            if not url:
+                return None
+
+            # 源表中已有MD5时在下载前查询上传缓存
+            file_info = self._cached_upload(job, job.md5)
+            if file_info is not None:
+                return file_info
+
+            if self.streaming:
+                file_info = self._stream_file(job, url)
+                if file_info is not None:
+                    return file_info
+
+            with self.metrics.stage('download', job.row_id) as timer:
+                # 摘要只用于上传缓存和 SHA-256，都不需要时分段下载的文件不再读取一遍
+                download = self.dfs.download_file_by_url(url, job.download_path, self.sha256,
+                                                         self.upload_cache is not None or self.sha256)
+                timer.size = download.size if download else 0
+                timer.error = download is None
+            if download is None:
+                self.logger.error(f"ID: {job.row_id}, {job.key} download failed: {url}")
+                return None
+
+            # MD5 在下载时已经计算，不需要再次读取文件
+            md5 = job.md5 or download.md5
+            if md5 != job.md5:
+                file_info = self._cached_upload(job, md5)
+                if file_info is not None:
+                    return file_info
+
+            with self.metrics.stage('upload', job.row_id) as timer:
+                upload_resp_json = self.fs.upload(job.space_id, job.download_path, job.file_name, job.upload_path,
+                                                  job.original)
+                file_info = self._upload_result(job, upload_resp_json)
+                timer.size = download.size
+                timer.error = file_info is None
+            self._cache_upload(job, md5, file_info)
+            return file_info
+        finally:
+            self._cleanup(job)
+
+    async def transfer_file_async(self, transfer, job: TransferJob) -> Optional[dict]:
+        """transfer_file 的协程版本，使用 AsyncTransfer 下载和上传"""
+        loop = asyncio.get_running_loop()
+        try:
+            url = job.url
+            if not url:
+                url = await loop.run_in_executor(None, self._resolve_url, job)
+                if not url:
+                    return None
+
+            file_info = self._cached_upload(job, job.md5)
+            if file_info is not None:
+                return file_info
+
+            if self.streaming:
+                file_info = await self._stream_file_async(transfer, job, url)
+                if file_info is not None:
+                    return file_info
+
+            with self.metrics.stage('download', job.row_id) as timer:
+                download = await transfer.download_file_by_url(url, job.download_path, self.sha256)
+                timer.size = download.size if download else 0
+                timer.error = download is None
+            if download is None:
+                self.logger.error(f"ID: {job.row_id}, {job.key} download failed: {url}")
+                return None
+
+            md5 = job.md5 or download.md5
+            if md5 != job.md5:
+                file_info = self._cached_upload(job, md5)
+                if file_info is not None:
+                    return file_info
+
+            with self.metrics.stage('upload', job.row_id) as timer:
+                upload_resp_json = await transfer.upload(job.space_id, job.download_path, job.file_name,
+                                                         job.upload_path, job.original)
+                file_info = self._upload_result(job, upload_resp_json)
+                timer.size = download.size
+                timer.error = file_info is None
+            self._cache_upload(job, md5, file_info)
+            return file_info
+        finally:
+            # 删除大文件可能需要较长时间，同样不在事件循环中执行
+            await loop.run_in_executor(None, self._cleanup, job)
+
+    def _stream_file(self, job: TransferJob, url: str) -> Optional[dict]:
+        """将下载响应直接转发到上传接口，失败时返回 None，由调用方落盘后重试"""
+        digest = ContentDigest(self.sha256)
+        with self.metrics.stage('stream', job.row_id) as timer:
+            try:
+                with self.dfs.open_stream(url) as response:
+                    if response is None:
+                        timer.error = True
+                        return None
+                    chunks = self.bandwidth.wrap(response.iter_content(chunk_size=self.dfs.chunk_size), 'download')
+                    chunks = digest.wrap(chunks)
+                    upload_resp_json = self.fs.upload_stream(job.space_id, chunks, job.file_name, job.upload_path,
+                                                             job.original, self.dfs.content_length(response))
+            except Exception as e:
+                upload_resp_json = {'error': str(e)}
+            file_info = self._stream_result(job, upload_resp_json, digest)
+            timer.size = digest.size
+            timer.error = file_info is None
+        return file_info
+
+    async def _stream_file_async(self, transfer, job: TransferJob, url: str) -> Optional[dict]:
+        """_stream_file 的协程版本"""
+        digest = ContentDigest(self.sha256)
+        with self.metrics.stage('stream', job.row_id) as timer:
+            try:
+                upload_resp_json = await transfer.upload_stream(url, job.space_id, job.file_name, job.upload_path,
+                                                                job.original, digest)
+            except Exception as e:
+                upload_resp_json = {'error': str(e)}
+            file_info = self._stream_result(job, upload_resp_json, digest)
+            timer.size = digest.size
+            timer.error = file_info is None
+        return file_info
+
+    def _stream_result(self, job: TransferJob, upload_resp_json: Optional[dict],
+                       digest: ContentDigest) -> Optional[dict]:
+        """检查流式上传的响应，失败时记录日志，成功时按转发过程中计算的MD5记录上传缓存"""
+        if upload_resp_json is None or "error" in upload_resp_json or not upload_resp_json.get('data'):
+            # 响应体已经被消费，无法重放，使用本地临时文件重试
+            self.logger.error(f"ID: {job.row_id}, {job.key} stream transfer failed, retry with local file: "
+                              f"{upload_resp_json}")
+            return None
+        file_info = upload_resp_json.get('data')
+        self._cache_upload(job, job.md5 or digest.result().md5, file_info)
+        return file_info
+
+    def _cached_upload(self, job: TransferJob, md5: Optional[str]) -> Optional[dict]:
+        """查询上传缓存，相同内容已经以相同文件名上传到相同位置时返回之前的文件信息"""
+        if self.upload_cache is None or not md5:
+            return None
+        return self.upload_cache.get(md5, job.space_id, job.upload_path, job.file_name, job.original)
+
+    def _cache_upload(self, job: TransferJob, md5: Optional[str], file_info: Optional[dict]) -> None:
+        """记录上传结果"""
+        if self.upload_cache is not None and md5 and file_info is not None:
+            self.upload_cache.put(md5, job.space_id, job.upload_path, job.file_name, job.original, file_info)
+
+    def _resolve_url(self, job: TransferJob) -> Optional[str]:
+        """获取任务的下载地址，只有 file_id 时从 t_origin_file 中查询"""
+        if job.url:
+            return job.url
+        with self.metrics.stage('resolve', job.row_id):
+            url = self.dfs.get_url_by_file_id(job.file_id)
+        if not url:
+            self.logger.error(f"ID: {job.row_id}, File_Id: {job.file_id}, {job.key} not found")
+        return url
+
+    def _upload_result(self, job: TransferJob, upload_resp_json: dict) -> Optional[dict]:
+        """检查上传响应，成功时返回文件信息"""
+        if "error" in upload_resp_json or not upload_resp_json.get('data'):
+            self.logger.error(f"ID: {job.row_id}, {job.key} upload error: {upload_resp_json}")
+            return None
+        return upload_resp_json.get('data')
+
+    @staticmethod
+    def _cleanup(job: TransferJob) -> None:
+        """删除任务的临时目录"""
+        if os.path.exists(job.download_path):
+            shutil.rmtree(os.path.dirname(job.download_path))
+
     @staticmethod
     def calculate_file_md5(file_path: str) -> str:
         """计算文件内容的 MD5 值"""
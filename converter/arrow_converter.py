@@ -1,19 +1,24 @@
 import json
 import os
-import shutil
 
-from tqdm import tqdm
-
-from converter.abstract_converter import AbstractConverter
+from converter.abstract_converter import AbstractConverter, TransferJob
 from utils.logger import create_logger
 from utils.mysql_connector import Database
 
 
 class ArrowConverter(AbstractConverter):
+    name = 'arrow_converter'
+    desc = 'arrow files'
+    table = 't_arrow_file'
+    columns = 'id, origin_file_info, channel_config_url, arrow_file_info, space_id'
+    # 没有 arrow 文件的行不会写入 ol_arrow_file_info，每一行都会写入 ol_origin_file_info
+    target_column = 'ol_origin_file_info'
+    # 原始文件和 arrow 文件互不依赖，同时传输
+    parallel_jobs = True
 
     def __init__(self):
         super().__init__()
-        self.logger = create_logger('arrow_converter')
+        self.logger = create_logger(self.name)
         self.db = Database(
             host=self.mysql_config['host'],
             port=self.mysql_config['port'],
@@ -22,23 +27,6 @@ class ArrowConverter(AbstractConverter):
             database='orienlink_batch_storage'
         )
 
-    def upload_file(self, space_id: int, file_path: str, file_name: str, folder: str, original: bool) -> dict:
-        """
-        上传文件并返回响应数据
-        :param original:
-        :param space_id: 空间ID
-        :param file_path: 本地文件路径
-        :param file_name: 文件名
-        :param folder: 文件夹路径
-        :return: 上传响应的数据
-        """
-        upload_resp_json = self.fs.upload(space_id, file_path, file_name, folder, original)
-        if "error" in upload_resp_json or not upload_resp_json.get('data'):
-            self.logger.error(f"File upload failed: {upload_resp_json}")
-            return None
-        else:
-            return upload_resp_json.get('data')
-
     # mysql> desc t_arrow_file;
     # +---------------------+--------------+------+-----+-------------------+-----------------------------+
     # | Field               | Type         | Null | Key | Default           | Extra                       |
@@ -60,101 +48,51 @@ class ArrowConverter(AbstractConverter):
     # | ol_origin_file_info | json         | YES  |     | NULL              |                             |
     # +---------------------+--------------+------+-----+-------------------+-----------------------------+
     # 15 rows in set (0.00 sec)
-    def convert(self):
-        connection = self.db.connect()
-        results = self.db.query(connection,
-                                "SELECT id, origin_file_info, channel_config_url, arrow_file_info,space_id FROM t_arrow_file")
-
-        with tqdm(total=len(results), desc="arrow files", unit="file") as pbar:
-            try:
-                connection.begin()
-                for row in results:
-                    origin_download_path = ''
-                    arrow_download_path = ''
-                    try:
-                        id = row[0]
-                        space_id = row[4]
-                        sql = 'UPDATE t_arrow_file SET '  # 开始拼接 SQL 语句
-                        params = []  # 用来存放 SQL 参数
-
-                        # -------------------------------origin_file_info---------------------------------
-                        origin_file_info_json = json.loads(row[1])
-                        origin_file_info_path = origin_file_info_json.get('path')
-                        origin_file_name = os.path.basename(origin_file_info_path)
-                        origin_download_path = f'tmp/arrow_origin/{id}/{origin_file_name}'
-
-                        download_success = self.dfs.download_file_by_url(origin_file_info_path, origin_download_path)
-                        if not download_success:
-                            self.logger.error(f"id {id} 原始文件下载失败")
-                            pbar.update(1)
-                            continue
-
-                        origin_file_info_path = origin_file_info_path.replace(
-                            'http://10.10.3.13:18082/group1/originalData/', '')
-                        origin_file_info_path = origin_file_info_path.replace(
-                            'http://10.10.3.13:18082/group1/localUpload/', '')
-                        origin_file_info_path = self.config_reader.get_fs_api()['fs_read_bucket'] + '/' + '/'.join(
-                            origin_file_info_path.split('/')[:-1])
-                        print("1112123123123123123123123211")
-                        print(origin_file_info_path)
-                        file_info = self.upload_file(space_id, origin_download_path, origin_file_name,
-                                                     origin_file_info_path, True)
-                        if file_info is None:
-                            self.logger.error(f"id {id} 原始文件上传失败")
-                            pbar.update(1)
-                            continue
-
-                        origin_file_name = file_info.get('fileName')
-                        sql += 'origin_file_name = %s, ol_origin_file_info = %s'  # 拼接字段
-                        params.append(origin_file_name)
-                        params.append(json.dumps(file_info))
-
-                        # ------------------------------arrow_file_info--------------------------------
-                        if row[3]:  # 如果有 arrow_file_info
-                            arrow_file_info_json = json.loads(row[3])
-                            arrow_file_info_path = arrow_file_info_json.get('path')
-                            arrow_file_name = arrow_file_info_path.split('name=')[1].split('&')[0]
-
-                            arrow_download_path = f'tmp/arrow_file/{id}/{arrow_file_name}'
-
-                            download_success = self.dfs.download_file_by_url(arrow_file_info_path, arrow_download_path)
-                            if not download_success:
-                                self.logger.error(f"id {id} arrow文件下载失败")
-                                pbar.update(1)
-                                continue
-
-                            arrow_file_info_path = "arrows/" + '/'.join(origin_file_info_path.split('/')[:-1])
-
-                            print('--==================')
-                            print(arrow_file_name)
-                            print(arrow_file_info_path)
-                            arrow_file_info = self.upload_file(space_id, arrow_download_path, arrow_file_name,
-                                                         arrow_file_info_path, False)
-                            if arrow_file_info is None :
-                                print("============+++++++++")
-                                self.logger.error(f"id {id} arrow文件上传失败")
-                                pbar.update(1)
-                                continue
-
-                            sql += ', ol_arrow_file_info = %s'
-                            params.append(json.dumps(arrow_file_info))
-
-                        # 添加 WHERE 子句
-                        sql += ' WHERE id = %s'
-                        params.append(id)
-
-                        # 执行 SQL 更新
-                        self.db.execute(connection, sql, tuple(params))
-                        pbar.update(1)
-
-                    finally:
-                        if origin_download_path and os.path.exists(origin_download_path):
-                            shutil.rmtree(os.path.dirname(origin_download_path))
-                        if arrow_download_path and os.path.exists(arrow_download_path):
-                            shutil.rmtree(os.path.dirname(arrow_download_path))
-                connection.commit()
-            except Exception as e:
-                self.logger.error(f"Exception occurred during conversion: {e}")
-                connection.rollback()
-            finally:
-                connection.close()
+    def build_jobs(self, row):
+        id = row[0]
+        space_id = row[4]
+
+        # -------------------------------origin_file_info---------------------------------
+        origin_file_info_json = json.loads(row[1])
+        origin_file_info_url = origin_file_info_json.get('path')
+        origin_file_name = os.path.basename(origin_file_info_url)
+
+        origin_file_info_path = origin_file_info_url.replace(
+            'http://10.10.3.13:18082/group1/originalData/', '')
+        origin_file_info_path = origin_file_info_path.replace(
+            'http://10.10.3.13:18082/group1/localUpload/', '')
+        origin_file_info_path = self.config_reader.get_fs_api()['fs_read_bucket'] + '/' + '/'.join(
+            origin_file_info_path.split('/')[:-1])
+        jobs = [TransferJob('origin', id, f'tmp/arrow_origin/{id}/{origin_file_name}', space_id, origin_file_name,
+                            origin_file_info_path, True, url=origin_file_info_url)]
+
+        # ------------------------------arrow_file_info--------------------------------
+        if row[3]:  # 如果有 arrow_file_info
+            arrow_file_info_json = json.loads(row[3])
+            arrow_file_info_url = arrow_file_info_json.get('path')
+            arrow_file_name = arrow_file_info_url.split('name=')[1].split('&')[0]
+            arrow_file_info_path = "arrows/" + '/'.join(origin_file_info_path.split('/')[:-1])
+            jobs.append(TransferJob('arrow', id, f'tmp/arrow_file/{id}/{arrow_file_name}', space_id, arrow_file_name,
+                                    arrow_file_info_path, False, url=arrow_file_info_url))
+        return jobs
+
+    def write_back(self, writer, row, file_infos):
+        file_info = file_infos['origin']
+        sql = 'UPDATE t_arrow_file SET '  # 开始拼接 SQL 语句
+        params = []  # 用来存放 SQL 参数
+
+        origin_file_name = file_info.get('fileName')
+        sql += 'origin_file_name = %s, ol_origin_file_info = %s'  # 拼接字段
+        params.append(origin_file_name)
+        params.append(json.dumps(file_info))
+
+        if 'arrow' in file_infos:
+            sql += ', ol_arrow_file_info = %s'
+            params.append(json.dumps(file_infos['arrow']))
+
+        # 添加 WHERE 子句
+        sql += ', update_time = update_time WHERE id = %s'
+        params.append(row[0])
+
+        # 执行 SQL 更新
+        writer.execute(sql, tuple(params))
@@ -1,19 +1,20 @@
-import os
-import shutil
 import json
 
-from tqdm import tqdm
-
-from converter.abstract_converter import AbstractConverter
+from converter.abstract_converter import AbstractConverter, TransferJob
 from utils.logger import create_logger
 from utils.mysql_connector import Database
 
 
 class ParseFileConverter(AbstractConverter):
+    name = 'parse_file_converter'
+    desc = 'parse file sync'
+    table = 't_parse_file'
+    columns = 'id, file_name, file_source_id, md5'
+    target_column = 'file_info'
 
     def __init__(self):
         super().__init__()
-        self.logger = create_logger('parse_file_converter')
+        self.logger = create_logger(self.name)
         self.db = Database(
             host=self.mysql_config['host'],
             port=self.mysql_config['port'],
@@ -40,60 +41,27 @@ class ParseFileConverter(AbstractConverter):
     # | is_some_ip     | tinyint(4)   | YES  |     | 0                 |                |
     # +----------------+--------------+------+-----+-------------------+----------------+
     # 12 rows in set (0.00 sec)
-    def convert(self):
-        connection = self.db.connect()
-        results = self.db.query(connection, "SELECT id, file_name, file_source_id,md5 FROM t_parse_file")
-
-        with tqdm(total=len(results), desc="parse file sync", unit="file") as pbar:
-            try:
-                connection.begin()  # 开始事务
-                for row in results:
-                    download_path = ''
-                    try:
-                        id = row[0]
-                        file_name = row[1]
-                        file_source_id = row[2]
-                        old_md5 = row[3]
-
-                        # 下载路径
-                        download_path = f'tmp/parse_file/{id}/{file_name}'
-                        download_success = self.dfs.dfs(file_source_id, download_path)
-                        if not download_success:
-                            # 记录下载失败的详细信息
-                            self.log_failure(id, file_source_id, file_name, 'Download failed',
-                                             'Failed to download from DFS')
-                            pbar.update(1)
-                            continue  # 如果下载失败，跳过当前文件
+    @staticmethod
+    def file_ids(row):
+        return [row[2]]
 
-                        # TODO
-                        default_space_id = self.config_reader.get_fs_api()['default_space_id']
-                        upload_resp_json = self.fs.upload(default_space_id, download_path, file_name, 'parse_files')
-                        if "error" in upload_resp_json or not upload_resp_json.get('data'):
-                            # 记录上传失败的详细信息
-                            self.log_failure(id, file_source_id, file_name, 'Upload failed', upload_resp_json)
-                            pbar.update(1)
-                            continue  # 如果上传失败，跳过当前文件
+    def build_jobs(self, row):
+        id = row[0]
+        file_name = row[1]
+        file_source_id = row[2]
+        md5 = row[3]
 
-                        # 上传成功，更新数据库
-                        file_info = upload_resp_json.get('data')
-                        file_name = file_info.get('fileName')
+        # TODO
+        default_space_id = self.config_reader.get_fs_api()['default_space_id']
+        # 下载路径
+        return [TransferJob('parse_file', id, f'tmp/parse_file/{id}/{file_name}', default_space_id, file_name,
+                            'parse_files', file_id=file_source_id, md5=md5)]
 
-                        sql = 'UPDATE t_parse_file SET file_name = %s, file_info = %s WHERE id = %s'
-                        params = (file_name, json.dumps(file_info), id)
-                        self.db.execute(connection, sql, params)
-                        pbar.update(1)
-                    finally:
-                        if download_path and os.path.exists(download_path):
-                            shutil.rmtree(os.path.dirname(download_path))
-                # 提交事务
-                connection.commit()
-            except Exception as e:
-                self.logger.error(f"Exception occurred during conversion: {e}")
-                connection.rollback()
-            finally:
-                connection.close()
+    def write_back(self, writer, row, file_infos):
+        # 上传成功，更新数据库
+        file_info = file_infos['parse_file']
+        file_name = file_info.get('fileName')
 
-    def log_failure(self, id: int, file_id: int, file_name: str, error_type: str, error_msg: str):
-        """记录失败的文件信息到日志文件"""
-        log_msg = f"ID: {id}, File_Id: {file_id} ,File Name: {file_name}, Error Type: {error_type}, Error Msg: {error_msg}"
-        self.logger.error(log_msg)
+        sql = 'UPDATE t_parse_file SET file_name = %s, file_info = %s, update_time = update_time WHERE id = %s'
+        params = (file_name, json.dumps(file_info), row[0])
+        writer.execute(sql, params)
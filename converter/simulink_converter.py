@@ -1,18 +1,20 @@
-import os
-import shutil
 import json
-from tqdm import tqdm
 
-from converter.abstract_converter import AbstractConverter
+from converter.abstract_converter import AbstractConverter, TransferJob
 from utils.logger import create_logger
 from utils.mysql_connector import Database
 
 
 class SimulinkConverter(AbstractConverter):
+    name = 'simulink_converter'
+    desc = 'simulink file sync'
+    table = 't_simulink_file_info'
+    columns = 'id, file_id, file_name'
+    target_column = 'simulink_file_info'
 
     def __init__(self):
         super().__init__()
-        self.logger = create_logger('simulink_converter')
+        self.logger = create_logger(self.name)
         self.db = Database(
             host=self.mysql_config['host'],
             port=self.mysql_config['port'],
@@ -38,48 +40,25 @@ class SimulinkConverter(AbstractConverter):
     # | model_check_status | int(4)        | YES  |     | NULL              |                             |
     # +--------------------+---------------+------+-----+-------------------+-----------------------------+
     # 11 rows in set (0.00 sec)
-    def convert(self):
-        connection = self.db.connect()
-        results = self.db.query(connection, "SELECT id,file_id,file_name FROM t_simulink_file_info")
+    @staticmethod
+    def file_ids(row):
+        return [row[1]]
 
-        with tqdm(total=len(results), desc="simulink file sync", unit="file") as pbar:
-            try:
-                connection.begin()
-                for row in results:
-                    download_path=''
-                    try:
-                        id = row[0]
-                        file_id = row[1]
-                        file_name = row[2]
+    def build_jobs(self, row):
+        id = row[0]
+        file_id = row[1]
+        file_name = row[2]
 
-                        download_path = f'tmp/simulink/{file_id}/{file_name}'
-                        download_success=self.dfs.dfs(file_id, download_path)
-                        if not download_success:
-                            self.logger.error(f"ID: {id}, File_Id: {file_id} ,File Name: {file_name}, Download failed")
-                            pbar.update(1)
-                            continue
-                        # TODO
-                        default_space_id = self.config_reader.get_fs_api()['default_space_id']
-                        upload_resp_json = self.fs.upload(default_space_id, download_path, file_name, 'models')
-                        if "error" in upload_resp_json or not upload_resp_json.get('data'):
-                            self.logger.error(f"ID: {id}, File_Id: {file_id} ,File Name: {file_name}, Error Msg: {upload_resp_json}")
-                            pbar.update(1)
-                            continue
-                        file_info = upload_resp_json.get('data')
-                        file_name = file_info.get('fileName')
+        # TODO
+        default_space_id = self.config_reader.get_fs_api()['default_space_id']
+        return [TransferJob('simulink', id, f'tmp/simulink/{id}/{file_name}', default_space_id, file_name,
+                            'models', file_id=file_id)]
 
-                        sql = 'UPDATE t_simulink_file_info SET file_name = %s ,simulink_file_info = %s FROM t_simulink_file_info WHERE id = %s'
-                        params = (file_name, json.dumps(file_info), id)
-                        self.db.execute(connection, sql, params)
-                        pbar.update(1)
-                    finally:
-                        if download_path and os.path.exists(download_path):
-                            shutil.rmtree(os.path.dirname(download_path))
-                connection.commit()
-            except Exception as e:
-                # 如果发生异常，回滚事务，并记录详细信息
-                self.logger.error(f"Exception occurred during conversion: {e}")
-                connection.rollback()
-            finally:
-                # 关闭数据库连接
-                connection.close()
+    def write_back(self, writer, row, file_infos):
+        file_info = file_infos['simulink']
+        file_name = file_info.get('fileName')
+
+        sql = ('UPDATE t_simulink_file_info SET file_name = %s, simulink_file_info = %s, update_time = update_time '
+               'WHERE id = %s')
+        params = (file_name, json.dumps(file_info), row[0])
+        writer.execute(sql, params)
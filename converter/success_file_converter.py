@@ -1,19 +1,24 @@
 import json
-import os
-import shutil
+from array import array
+from itertools import groupby
 
-from tqdm import tqdm
-
-from converter.abstract_converter import AbstractConverter
+from converter.abstract_converter import AbstractConverter, TransferJob
 from utils.logger import create_logger
 from utils.mysql_connector import Database
 
 
 class SuccessConverter(AbstractConverter):
+    name = 'success_file_converter'
+    desc = 'success file sync'
+    table = 't_success_file'
+    columns = 'id, origin_file_id, file_name'
+    # 同一个源文件的行必须在同一个分片中处理
+    shard_key = 'origin_file_id'
+    target_column = 'origin_file_info'
 
     def __init__(self):
         super().__init__()
-        self.logger = create_logger('success_file_converter')
+        self.logger = create_logger(self.name)
         self.db = Database(
             host=self.mysql_config['host'],
             port=self.mysql_config['port'],
@@ -46,73 +51,64 @@ class SuccessConverter(AbstractConverter):
     # | origin_file_info      | json         | YES  |     | NULL              |                             |
     # +-----------------------+--------------+------+-----+-------------------+-----------------------------+
     # 18 rows in set (0.00 sec)
-    def convert(self):
-        connection = self.db.connect()
-        results = self.db.query(connection, "SELECT id,origin_file_id, file_name FROM t_success_file")
-
-        with tqdm(total=len(results), desc="success file sync", unit="file") as pbar:
-            try:
-                connection.begin()
-                # 将查询结果按照 origin_file_id 分组为字典
-                grouped_results = {}
-                for row in results:
-                    origin_file_id = row[1]
-                    if origin_file_id not in grouped_results:
-                        grouped_results[origin_file_id] = []
-                    grouped_results[origin_file_id].append(row)
-
-                for origin_file_id, rows in grouped_results.items():
-                    download_path = ''
-                    try:
-                        file_name = rows[0][2]
-                        ids = [row[0] for row in rows]
-
-                        download_path = f'tmp/success_file/{origin_file_id}/{file_name}'
-
-                        url = self.dfs.get_url_by_file_id(origin_file_id)
-                        if not url:
-                            self.logger.error(f"{','.join(str(item) for item in ids)} not found: {origin_file_id}")
-                            pbar.update(len(ids))
-                            continue
-                        download_success = self.dfs.download_file_by_url(url, download_path)
-                        if not download_success:
-                            self.logger.error(
-                                f"{','.join(str(item) for item in ids)} Failed to download file: {origin_file_id}")
-                            pbar.update(len(ids))
-                            continue
-
-                        # TODO
-                        default_space_id = self.config_reader.get_fs_api()['default_space_id']
-
-                        url = url.replace(
-                            'http://10.10.3.13:18082/group1/originalData/', '')
-                        url = self.config_reader.get_fs_api()['fs_read_bucket'] + '/' + '/'.join(
-                            url.split('/')[:-1])
-                        print(f"url: {url}")
-                        upload_resp_json = self.fs.upload(default_space_id, download_path, file_name, url,True)
-
-                        if "error" in upload_resp_json or not upload_resp_json.get('data'):
-                            self.logger.error(
-                                f"{','.join(str(item) for item in ids)} Failed to upload file: {origin_file_id}")
-                            pbar.update(len(ids))
-                            continue
-                        file_info = upload_resp_json.get('data')
-                        file_name = file_info.get('fileName')
-
-                        for row in rows:
-                            id = row[0]
-                            sql = 'UPDATE t_success_file SET file_name = %s, origin_file_info = %s WHERE id = %s'
-                            params = (file_name, json.dumps(file_info), id)
-                            print("----------------")
-                            print(params)
-                            self.db.execute(connection, sql, params)
-                            pbar.update(1)
-                    finally:
-                        if download_path and os.path.exists(download_path):
-                            shutil.rmtree(os.path.dirname(download_path))
-                connection.commit()
-            except Exception as e:
-                self.logger.error(f"Exception occurred during conversion: {e}",exc_info=True)
-                connection.rollback()
-            finally:
-                connection.close()
+    def _where(self):
+        # 没有 origin_file_id 的行无法下载
+        where, params = self._condition
+        return ' AND '.join(filter(None, ['origin_file_id IS NOT NULL', where and f'({where})'])), params
+
+    def query_rows(self, connection):
+        # 按 origin_file_id 排序流式读取，相邻的行按 origin_file_id 分组，同一个原始文件只下载上传一次，
+        # 每组只保存 (origin_file_id, ids, file_name)，ids 使用 array 存储，内存只与最大的一组有关；
+        # origin_file_id 上没有索引，只排序一次，不能按页查询
+        where, params = self._where()
+        rows = self.db.iter_ordered('origin_file_id, id, file_name', self.table, where, params,
+                                    order_by='origin_file_id, id', batch_size=self.query_batch_size)
+        for origin_file_id, group in groupby(rows, key=lambda row: row[0]):
+            first = next(group)
+            ids = array('l', [first[1]])
+            ids.extend(row[1] for row in group)
+            yield origin_file_id, ids, first[2]
+
+    def count_rows(self, connection):
+        return self.db.count(connection, self.table, *self._where())
+
+    @staticmethod
+    def row_size(row):
+        return len(row[1])
+
+    @staticmethod
+    def row_ids(row):
+        return row[1].tolist()
+
+    @staticmethod
+    def file_ids(row):
+        return [row[0]]
+
+    def build_jobs(self, row):
+        origin_file_id, row_ids, file_name = row
+        ids = ','.join(map(str, row_ids))
+
+        url = self.dfs.get_url_by_file_id(origin_file_id)
+        if not url:
+            self.logger.error(f"{ids} not found: {origin_file_id}")
+            return None
+
+        # TODO
+        default_space_id = self.config_reader.get_fs_api()['default_space_id']
+
+        upload_path = url.replace(
+            'http://10.10.3.13:18082/group1/originalData/', '')
+        upload_path = self.config_reader.get_fs_api()['fs_read_bucket'] + '/' + '/'.join(
+            upload_path.split('/')[:-1])
+        return [TransferJob('origin', ids, f'tmp/success_file/{origin_file_id}/{file_name}', default_space_id,
+                            file_name, upload_path, True, url=url)]
+
+    def write_back(self, writer, row, file_infos):
+        file_info = file_infos['origin']
+        file_name = file_info.get('fileName')
+
+        file_info_json = json.dumps(file_info)
+        for id in row[1]:
+            sql = ('UPDATE t_success_file SET file_name = %s, origin_file_info = %s, update_time = update_time '
+                   'WHERE id = %s')
+            writer.execute(sql, (file_name, file_info_json, id))
@@ -1,17 +1,22 @@
 import json
 import os
-import shutil
-from tqdm import tqdm
-from converter.abstract_converter import AbstractConverter
+from converter.abstract_converter import AbstractConverter, TransferJob
 from utils.logger import create_logger
 from utils.mysql_connector import Database
 
 
 class VideoConverter(AbstractConverter):
+    name = 'video_converter'
+    desc = 'video sync'
+    table = 't_time_sequence_object'
+    columns = 'id, poster_url, file_path, space_id'
+    target_column = 'video_file_info'
+    # 封面和视频互不依赖，同时传输
+    parallel_jobs = True
 
     def __init__(self):
         super().__init__()
-        self.logger = create_logger('video_converter')
+        self.logger = create_logger(self.name)
         self.db = Database(
             host=self.mysql_config['host'],
             port=self.mysql_config['port'],
@@ -58,86 +63,41 @@ class VideoConverter(AbstractConverter):
     # | origin_file_info    | json         | YES  |     | NULL              |                             |
     # +---------------------+--------------+------+-----+-------------------+-----------------------------+
     # 31 rows in set (0.00 sec)
-    def convert(self):
-        connection = self.db.connect()
-        results = self.db.query(connection, "SELECT id, poster_url, file_path, space_id FROM t_time_sequence_object")
+    def build_jobs(self, row):
+        id = row[0]
+        poster_url = row[1]
+        file_path = row[2]
+        space_id = row[3]
+        gofast_host = self.config_reader.get_gofast_config()
+        jobs = []
 
-        with tqdm(total=len(results), desc="video sync", unit="file") as pbar:
-            try:
-                connection.begin()  # 开始事务
-                for row in results:
-                    poster_download_path = ''
-                    video_download_path = ''
-                    try:
-                        id = row[0]
-                        poster_url = row[1]
-                        file_path = row[2]
-                        space_id = row[3]
+        # ---------------------------poster_url-------------------------------
+        if poster_url:
+            poster_name = os.path.basename(poster_url)
+            jobs.append(TransferJob('poster', id, f'tmp/video_poster/{id}/{poster_name}', space_id, poster_name,
+                                    'posters/sync', url=poster_url.replace("/gofast", gofast_host)))
 
-                        update_sql = 'UPDATE t_time_sequence_object SET '
-                        params = []
+        # --------------------------file_path---------------------------------
+        file_path_name = os.path.basename(file_path)
+        jobs.append(TransferJob('video', id, f'tmp/video_file/{id}/{file_path_name}', space_id, file_path_name,
+                                'video/sync', url=file_path.replace("/gofast", gofast_host)))
+        return jobs
 
-                        # ---------------------------poster_url-------------------------------
-                        if poster_url:
-                            poster_name = os.path.basename(poster_url)
-                            poster_download_path = f'tmp/video_poster/{id}/{poster_name}'
-                            poster_url = poster_url.replace("/gofast", self.config_reader.get_gofast_config())
-                            download_poster_success = self.dfs.download_file_by_url(poster_url, poster_download_path)
-                            if not download_poster_success:
-                                self.logger.error(f'id {id} poster download error: {poster_url}')
-                                pbar.update(1)
-                                continue
+    def write_back(self, writer, row, file_infos):
+        columns = []
+        params = []
+        if 'poster' in file_infos:
+            columns.append('post_file_info = %s')
+            params.append(json.dumps(file_infos['poster']))
+        columns.append('video_file_info = %s')
+        params.append(json.dumps(file_infos['video']))
+        columns.append('update_time = update_time')
 
-                            upload_resp_json = self.fs.upload(space_id, poster_download_path, poster_name,
-                                                              'posters/sync')
-                            if "error" in upload_resp_json or not upload_resp_json.get('data'):
-                                self.logger.error(f'id {id} poster upload error: {upload_resp_json}')
-                                pbar.update(1)
-                                continue
-                            file_info = upload_resp_json.get('data')
-                            update_sql += 'post_file_info = %s'  # 拼接字段
-                            params.append(json.dumps(file_info))
+        # 最后拼接 WHERE 子句
+        update_sql = 'UPDATE t_time_sequence_object SET ' + ', '.join(columns) + ' WHERE id = %s'
+        params.append(row[0])
 
-                        # --------------------------file_path---------------------------------
-                        file_path_name = os.path.basename(file_path)
-                        video_download_path = f'tmp/video_file/{id}/{file_path_name}'
-                        file_path = file_path.replace("/gofast", self.config_reader.get_gofast_config())
-                        video_download_success = self.dfs.download_file_by_url(file_path, video_download_path)
-                        if not video_download_success:
-                            self.logger.error(f'id {id} video download error: {file_path}')
-                            pbar.update(1)
-                            continue
-
-                        upload_resp_json = self.fs.upload(space_id, video_download_path, file_path_name, 'video/sync')
-                        if "error" in upload_resp_json or not upload_resp_json.get('data'):
-                            self.logger.error(f'id {id} video upload error: {upload_resp_json}')
-                            pbar.update(1)
-                            continue
-                        video_file_info = upload_resp_json.get('data')
-                        if 'poster_url' in update_sql:
-                            update_sql += ', '  # 如果之前已经有 poster_url 字段，则用逗号分隔
-                        update_sql += 'video_file_info = %s'  # 拼接字段
-                        params.append(json.dumps(video_file_info))
-
-                        # 最后拼接 WHERE 子句
-                        update_sql += ' WHERE id = %s'
-                        params.append(id)
-
-                        self.db.execute(connection, update_sql, tuple(params))
-                    finally:
-                        if poster_download_path and os.path.exists(poster_download_path):
-                            shutil.rmtree(os.path.dirname(poster_download_path))
-                        if video_download_path and os.path.exists(video_download_path):
-                            shutil.rmtree(os.path.dirname(video_download_path))
-                    pbar.update(1)
-                # 提交事务
-                connection.commit()
-            except Exception as e:
-                # 如果发生异常，回滚事务并记录日志
-                self.logger.error(f"Exception occurred during conversion: {e}")
-                connection.rollback()
-            finally:
-                connection.close()
+        writer.execute(update_sql, tuple(params))
 
 
 if __name__ == '__main__':
@@ -1,18 +1,21 @@
 import os
-import shutil
 import json
-from tqdm import tqdm
 
-from converter.abstract_converter import AbstractConverter
+from converter.abstract_converter import AbstractConverter, TransferJob
 from utils.logger import create_logger
 from utils.mysql_connector import Database
 
 
 class ViewConverter(AbstractConverter):
+    name = 'view_converter'
+    desc = 'view sync'
+    table = 't_node_tree'
+    columns = 'id, template_url, space_id'
+    target_column = 'file_info'
 
     def __init__(self):
         super().__init__()
-        self.logger = create_logger('view_converter')
+        self.logger = create_logger(self.name)
         self.db = Database(
             host=self.mysql_config['host'],
             port=self.mysql_config['port'],
@@ -45,45 +48,16 @@ class ViewConverter(AbstractConverter):
     # | file_info     | json          | YES  |     | NULL              |                             |
     # +---------------+---------------+------+-----+-------------------+-----------------------------+
     # 17 rows in set (0.00 sec)
-    def convert(self):
-        connection = self.db.connect()
-        results = self.db.query(connection,"SELECT id, template_url,space_id FROM t_node_tree")
-
-        with tqdm(total=len(results), desc="video sync", unit="file") as pbar:
-            try:
-                for row in results:
-                    download_path = ''
-                    try:
-                        id = row[0]
-                        template_url = row[1]
-                        space_id = row[2]
-
-                        file_name = os.path.basename(template_url)
-                        download_path = f'tmp/view/{id}/{file_name}'
-
-                        download_success=self.dfs.download_file_by_url(template_url, download_path)
-                        if not download_success:
-                            self.logger.error(f"id {id} download error: {template_url}")
-                            pbar.update(1)
-                            continue
-
-                        upload_resp_json = self.fs.upload(space_id, download_path, file_name, 'dataview')
-                        if "error" in upload_resp_json or not upload_resp_json.get('data') :
-                            self.logger.error(f"id {id} upload error: {upload_resp_json}")
-                            pbar.update(1)
-                            continue
-                        file_info = upload_resp_json.get('data')
-
-                        sql = 'UPDATE t_node_tree SET file_info = %s FROM t_node_tree WHERE id = %s'
-                        params = (json.dumps(file_info), id)
-                        self.db.execute(connection, sql, params)
-                        pbar.update(1)
-                    finally:
-                        if download_path and os.path.exists(download_path):
-                            shutil.rmtree(os.path.dirname(download_path))
-                connection.commit()
-            except Exception as e:
-                self.logger.error(f"Exception occurred during conversion: {e}")
-                connection.rollback()
-            finally:
-                connection.close()
+    def build_jobs(self, row):
+        id = row[0]
+        template_url = row[1]
+        space_id = row[2]
+
+        file_name = os.path.basename(template_url)
+        return [TransferJob('view', id, f'tmp/view/{id}/{file_name}', space_id, file_name, 'dataview',
+                            url=template_url)]
+
+    def write_back(self, writer, row, file_infos):
+        sql = 'UPDATE t_node_tree SET file_info = %s, update_time = update_time WHERE id = %s'
+        params = (json.dumps(file_infos['view']), row[0])
+        writer.execute(sql, params)
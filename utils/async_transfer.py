@@ -0,0 +1,242 @@
+import asyncio
+import os
+from typing import Optional, Tuple
+
+import aiohttp
+
+from utils.bandwidth import Bandwidth
+from utils.concurrency_limiter import AdaptiveLimiter
+from utils.dfs_file_info import ContentDigest, DownloadResult
+
+# 请求或读取响应体时可以重试的错误：连接被重置、超时、响应体不完整
+INTERRUPTIONS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)
+
+
+class AsyncTransfer:
+    """基于 asyncio 的传输引擎，对应 DFS.download_file_by_url 和 FileUploader.upload 的非阻塞版本"""
+
+    def __init__(self, url: str, original_url: str, limit: int = 200, connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None, chunk_size: int = 4 * 1024 * 1024,
+                 bandwidth: Optional[Bandwidth] = None, resume_attempts: int = 3,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        """
+        初始化传输引擎
+        :param url: 上传目标的URL地址
+        :param original_url: 原始文件上传的URL地址
+        :param limit: 下载和上传各自同时打开的最大连接数，不小于同时执行的传输任务数
+        :param connect_timeout: 建立连接的超时时间（秒），包括等待连接池空闲连接的时间
+        :param read_timeout: 两次读取数据之间的超时时间（秒）
+        :param chunk_size: 下载时每次写入的最大字节数
+        :param bandwidth: 与线程引擎相同的带宽限制，未指定时不限速
+        :param resume_attempts: 下载请求失败或中断后重试的最大次数
+        :param limiter: 与线程引擎相同的按 host 自适应并发限流器，未指定时不限制
+        """
+        self.url = url
+        self.original_url = original_url
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.bandwidth = bandwidth or Bandwidth()
+        self.resume_attempts = resume_attempts
+        self.limiter = limiter or AdaptiveLimiter(enabled=False)
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_connect=connect_timeout,
+                                             sock_read=read_timeout)
+        # 流式传输时一个任务同时占用一个下载连接和一个上传连接，两者共用连接池时，
+        # 所有任务都拿到下载连接后上传请求会一直等待空闲连接，因此下载和上传使用各自的连接池
+        self.download_session = None
+        self.upload_session = None
+
+    async def __aenter__(self):
+        self.download_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit),
+                                                      timeout=self.timeout)
+        self.upload_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit),
+                                                    timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.download_session.close()
+        await self.upload_session.close()
+
+    async def download_file_by_url(self, url: str, download_path: str,
+                                   sha256: bool = False) -> Optional[DownloadResult]:
+        """
+        下载文件到本地，写入的同时计算摘要；请求失败或传输中断时重试，已经写入数据时用 Range 从该位置继续，
+        最多重试 resume_attempts 次，与 DFS.download_file_by_url 相同
+        :return: 下载结果，失败时返回 None
+        """
+        loop = asyncio.get_running_loop()
+        digest = ContentDigest(sha256)
+        written, length = 0, None
+        opened = False
+        resumable = interrupted = True
+        for attempt in range(self.resume_attempts + 1):
+            if attempt and opened:
+                if not resumable:
+                    break
+                print(f"Resume download from byte {written}: {url}")
+            headers = {'Range': f'bytes={written}-'} if opened else None
+            # 整个传输过程占用 gofast 的一个并发名额
+            async with self.limiter.slot_async(url) as slot:
+                try:
+                    async with self.download_session.get(url, headers=headers) as response:
+                        slot.observe_status(response.status)
+                        if opened:
+                            if response.status != 206:
+                                print(f"Failed to resume download: {response.status}")
+                                break
+                        else:
+                            if response.status != 200:
+                                print(f"Failed to download file: {response.status}")
+                                return None
+                            # 压缩传输时 Content-Length 与解压后的长度不一致
+                            length = None if response.headers.get('Content-Encoding') else response.content_length
+                            resumable = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                            # 保存文件到本地，创建目录和文件也在线程中执行
+                            await loop.run_in_executor(None, self._create, download_path)
+                            opened = True
+                        size, interrupted = await self._save(response, download_path, written, digest)
+                        written += size
+                except INTERRUPTIONS as e:
+                    slot.error = True
+                    print(f"Download request failed: {e}")
+                    continue
+            if not interrupted and (length is None or written >= length):
+                break
+
+        if interrupted or (length is not None and written != length):
+            print(f"Incomplete download: {written}/{length} bytes")
+            return None
+        return digest.result(download_path)
+
+    async def _save(self, response, download_path: str, position: int, digest: ContentDigest) -> Tuple[int, bool]:
+        """
+        从 position 开始写入响应体，攒够 chunk_size 后在线程中写入文件和计算摘要，不阻塞事件循环；
+        连接中断时保留已收到的数据
+        :return: (写入的字节数, 是否中断)
+        """
+        loop = asyncio.get_running_loop()
+        written = 0
+        interrupted = True
+        buffer = bytearray()
+        file = await loop.run_in_executor(None, self._open_at, download_path, position)
+        try:
+            try:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    buffer += chunk
+                    await self.bandwidth.throttle_async('download', len(chunk))
+                    if len(buffer) >= self.chunk_size:
+                        await loop.run_in_executor(None, self._write, file, buffer, digest)
+                        written += len(buffer)
+                        buffer = bytearray()
+                interrupted = False
+            except INTERRUPTIONS as e:
+                print(f"Download interrupted: {e}")
+            if buffer:
+                await loop.run_in_executor(None, self._write, file, buffer, digest)
+                written += len(buffer)
+        finally:
+            await loop.run_in_executor(None, file.close)
+        return written, interrupted
+
+    @staticmethod
+    def _create(path: str) -> None:
+        """创建所在目录和空文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+    @staticmethod
+    def _open_at(path: str, position: int):
+        """打开已有文件并定位到 position"""
+        file = open(path, 'r+b')
+        file.seek(position)
+        return file
+
+    @staticmethod
+    def _write(file, data: bytearray, digest: ContentDigest) -> None:
+        file.write(data)
+        digest.update(data)
+
+    async def upload(self, space_id: int, file_path: str, field_name: str, upload_path: str,
+                     original: bool = False) -> dict:
+        """
+        上传文件到指定URL
+        :param original: 是否使用原始文件上传接口
+        :param space_id: 工作空间id
+        :param file_path: 本地文件的路径
+        :param field_name: 上传时字段的名称
+        :param upload_path: 上传的目标目录
+        :return: 服务器的响应数据
+        """
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, open, file_path, 'rb')
+        try:
+            size = await loop.run_in_executor(None, os.path.getsize, file_path)
+            content = file
+            if self.bandwidth.enabled:
+                content = self._throttled_file(file)
+            return await self._post(space_id, content, field_name, upload_path, original, size)
+        finally:
+            await loop.run_in_executor(None, file.close)
+
+    async def upload_stream(self, url: str, space_id: int, field_name: str, upload_path: str,
+                            original: bool = False, digest: Optional[ContentDigest] = None) -> Optional[dict]:
+        """
+        将下载响应体直接作为文件内容上传，不经过本地文件
+        :param digest: 传入时在转发的同时计算摘要
+        :return: 服务器的响应数据，下载失败时返回 None
+        """
+        # 转发期间一直占用 gofast 的一个并发名额，上传接口的名额在 _post 中另外占用
+        async with self.limiter.slot_async(url) as slot:
+            try:
+                async with self.download_session.get(url) as response:
+                    slot.observe_status(response.status)
+                    if response.status != 200:
+                        print(f"Failed to download file: {response.status}")
+                        return None
+                    content = response.content
+                    if digest is not None or self.bandwidth.enabled:
+                        content = self._forward_chunks(response.content, digest)
+                    return await self._post(space_id, content, field_name, upload_path, original)
+            except INTERRUPTIONS as e:
+                slot.error = True
+                print(f"Download request failed: {e}")
+                return None
+
+    async def _forward_chunks(self, content, digest: Optional[ContentDigest]):
+        """按块读取响应体，计算摘要并按下载和上传两个方向限速"""
+        async for chunk in content.iter_chunked(self.chunk_size):
+            if digest is not None:
+                digest.update(chunk)
+            await self.bandwidth.throttle_async('download', len(chunk))
+            await self.bandwidth.throttle_async('upload', len(chunk))
+            yield chunk
+
+    async def _throttled_file(self, file):
+        """按块在线程中读取本地文件并按上传限速"""
+        loop = asyncio.get_running_loop()
+        while chunk := await loop.run_in_executor(None, file.read, self.chunk_size):
+            await self.bandwidth.throttle_async('upload', len(chunk))
+            yield chunk
+
+    async def _post(self, space_id: int, content, field_name: str, upload_path: str, original: bool,
+                    size: Optional[int] = None) -> dict:
+        """
+        以 multipart/form-data 上传文件内容，content 为文件对象或下载响应的 StreamReader
+        :param size: 文件内容的字节数，用于按每 MB 的耗时观测上传接口的延迟
+        """
+        data = aiohttp.FormData()
+        data.add_field('spaceId', str(space_id))
+        data.add_field('path', upload_path)
+        data.add_field('file', content, filename=field_name)
+        url = self.original_url if original else self.url
+        async with self.limiter.slot_async(url) as slot:
+            try:
+                async with self.upload_session.post(url, data=data) as response:
+                    slot.observe_status(response.status, size)
+                    # 检查响应状态
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    else:
+                        return {'error': '上传失败', 'status_code': response.status, 'message': await response.text()}
+            except INTERRUPTIONS as e:
+                slot.error = True
+                return {'error': str(e)}
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+
+class TokenBucket:
+    """令牌桶，每秒补充 rate 个字节的令牌，最多积累 burst 秒的令牌；令牌不足时允许透支，由调用方等待透支的部分"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        """
+        :param rate: 每秒允许的字节数
+        :param burst: 空闲时最多积累多少秒的令牌
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = rate * burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.rate * self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """切换时间段时调整速率，已积累的令牌不超过新的上限"""
+        with self._lock:
+            if rate == self.rate:
+                return
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.tokens = min(self.tokens, rate * self.burst)
+
+    def reserve(self, size: int) -> float:
+        """取走 size 个字节的令牌，返回需要等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= size
+            return max(0.0, -self.tokens / self.rate)
+
+
+class _Window:
+    """一个时间段内的限速，时间为本地时间 HH:MM，end 小于 start 时跨过午夜"""
+
+    def __init__(self, start: str, end: str, rate: float = 0, download_rate: float = 0, upload_rate: float = 0):
+        self.start = self._minutes(start)
+        self.end = self._minutes(end)
+        self.rates = {'total': float(rate), 'download': float(download_rate), 'upload': float(upload_rate)}
+
+    @staticmethod
+    def _minutes(value: str) -> int:
+        hour, minute = value.split(':')
+        return int(hour) * 60 + int(minute)
+
+    def contains(self, minutes: int) -> bool:
+        if self.start <= self.end:
+            return self.start <= minutes < self.end
+        return minutes >= self.start or minutes < self.end
+
+
+class Bandwidth:
+    """
+    所有下载和上传共用的带宽限制
+    rate 限制下载和上传的总流量，download_rate / upload_rate 分别限制单个方向，0 表示不限制；
+    schedule 中的时间段覆盖默认值，例如白天限速、夜间全速
+    """
+
+    DIRECTIONS = ('download', 'upload')
+
+    def __init__(self, rate: float = 0, download_rate: float = 0, upload_rate: float = 0, burst: float = 1.0,
+                 schedule: Optional[List[dict]] = None):
+        """
+        :param rate: 下载和上传合计每秒的字节数
+        :param download_rate: 下载每秒的字节数
+        :param upload_rate: 上传每秒的字节数
+        :param burst: 空闲时最多积累多少秒的流量
+        :param schedule: 时间段列表，每项包含 start、end 以及 rate / download_rate / upload_rate
+        """
+        self.default = {'total': float(rate), 'download': float(download_rate), 'upload': float(upload_rate)}
+        self.windows = [_Window(**window) for window in schedule or []]
+        self.enabled = any(self.default.values()) or any(any(w.rates.values()) for w in self.windows)
+        # 限速由多少个进程平分
+        self.shares = 1
+        self._buckets = {name: TokenBucket(1.0, burst) for name in ('total',) + self.DIRECTIONS}
+
+    def share(self, count: int) -> None:
+        """配置的限速是所有进程合计的上限，分片运行时每个进程只使用其中的 1/count"""
+        self.shares = max(count, 1)
+
+    def rates(self) -> dict:
+        """当前时间段当前进程生效的限速"""
+        now = datetime.now()
+        minutes = now.hour * 60 + now.minute
+        rates = self.default
+        for window in self.windows:
+            if window.contains(minutes):
+                rates = window.rates
+                break
+        if self.shares == 1:
+            return rates
+        return {name: rate / self.shares for name, rate in rates.items()}
+
+    def reserve(self, direction: str, size: int) -> float:
+        """记录 direction 方向传输了 size 个字节，返回需要等待的秒数"""
+        if not self.enabled or not size:
+            return 0.0
+        rates = self.rates()
+        delay = 0.0
+        for name in ('total', direction):
+            if rates[name]:
+                bucket = self._buckets[name]
+                bucket.set_rate(rates[name])
+                delay = max(delay, bucket.reserve(size))
+        return delay
+
+    def throttle(self, direction: str, size: int) -> None:
+        """传输 size 个字节后调用，超过限速时阻塞当前线程"""
+        delay = self.reserve(direction, size)
+        if delay:
+            time.sleep(delay)
+
+    async def throttle_async(self, direction: str, size: int) -> None:
+        """throttle 的协程版本"""
+        delay = self.reserve(direction, size)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def wrap(self, chunks: Iterable[bytes], direction: str) -> Iterable[bytes]:
+        """按限速产出数据块"""
+        if not self.enabled:
+            yield from chunks
+            return
+        for chunk in chunks:
+            self.throttle(direction, len(chunk))
+            yield chunk
@@ -0,0 +1,44 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any
+
+
+class CheckpointJournal:
+    """本地 SQLite 检查点，记录已经完成的行及其上传结果，重新运行时跳过这些行"""
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLite 文件路径，每个转换器一个文件
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS done (id TEXT PRIMARY KEY, file_info TEXT, update_time REAL)')
+        self.connection.commit()
+
+    def is_done(self, row_id: Any) -> bool:
+        """该行是否已经完成"""
+        cursor = self.connection.execute('SELECT 1 FROM done WHERE id = ?', (str(row_id),))
+        return cursor.fetchone() is not None
+
+    def mark(self, row_id: Any, file_info: Any) -> None:
+        """记录完成的行，commit 后才会写入文件"""
+        self.connection.execute('INSERT OR REPLACE INTO done (id, file_info, update_time) VALUES (?, ?, ?)',
+                                (str(row_id), json.dumps(file_info), time.time()))
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    def clear(self) -> None:
+        """删除所有记录，下次运行时重新处理所有选中的行"""
+        self.connection.execute('DELETE FROM done')
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
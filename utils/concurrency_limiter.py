@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+
+
+class _HostLimit:
+    """单个 host 的并发上限和观测状态"""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.in_flight = 0
+        # 最近观测到的最低延迟，作为判断拥塞的基准
+        self.baseline = None
+        # 上次减小上限的时间，在此之前发出的请求不再触发减小
+        self.last_backoff = 0.0
+        self.condition = threading.Condition()
+        # 协程等待名额使用的条件变量，绑定创建它的事件循环，每次 asyncio.run 都会重新创建
+        self._async_condition = None
+        self._loop = None
+
+    def async_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._async_condition, self._loop = asyncio.Condition(), loop
+        return self._async_condition
+
+
+class _Slot:
+    """一次请求占用的并发名额，记录该请求的延迟和是否出错"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.latency = None
+        self.error = False
+
+    def observe(self, response, size: Optional[int] = None) -> None:
+        """
+        根据响应记录观测值
+        :param response: requests 的响应，5xx 视为服务端过载
+        :param size: 请求体字节数，上传时按每 MB 的耗时计算延迟，避免大文件被误判为拥塞
+        """
+        self._record(response.elapsed.total_seconds(), response.status_code, size)
+
+    def observe_status(self, status: int, size: Optional[int] = None) -> None:
+        """aiohttp 的响应没有 elapsed，按收到响应头时距开始的时间计算延迟，参数含义同 observe"""
+        self._record(time.monotonic() - self.start, status, size)
+
+    def _record(self, latency: float, status: int, size: Optional[int]) -> None:
+        if size:
+            latency /= max(size / (1024 * 1024), 1)
+        self.latency = latency
+        self.error = status >= 500
+
+
+class AdaptiveLimiter:
+    """按 host 自适应调整并发数的限流器（AIMD）：请求正常时缓慢增加上限，出错或延迟明显升高时按比例减小"""
+
+    def __init__(self, enabled: bool = True, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 latency_tolerance: float = 2.0, backoff: float = 0.7):
+        """
+        :param enabled: 关闭时不限制并发
+        :param initial: 每个 host 初始的并发上限
+        :param min_limit: 并发上限的最小值
+        :param max_limit: 并发上限的最大值
+        :param latency_tolerance: 延迟超过基准的该倍数时视为拥塞
+        :param backoff: 拥塞时并发上限乘以该系数
+        """
+        self.enabled = enabled
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> _HostLimit:
+        parts = urlsplit(url)
+        host = f'{parts.scheme}://{parts.netloc}'
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = _HostLimit(float(self.initial))
+            return self._hosts[host]
+
+    def limits(self) -> dict:
+        """当前每个 host 的并发上限"""
+        with self._lock:
+            return {host: int(state.limit) for host, state in self._hosts.items()}
+
+    @contextmanager
+    def slot(self, url: str):
+        """占用 url 所在 host 的一个并发名额，名额不足时等待"""
+        slot = _Slot()
+        if not self.enabled:
+            yield slot
+            return
+
+        state = self._host(url)
+        with state.condition:
+            while state.in_flight >= int(state.limit):
+                state.condition.wait()
+            state.in_flight += 1
+        slot.start = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            slot.error = True
+            raise
+        finally:
+            if slot.latency is None:
+                slot.latency = time.monotonic() - slot.start
+            with state.condition:
+                state.in_flight -= 1
+                self._adjust(state, slot)
+                state.condition.notify_all()
+
+    @asynccontextmanager
+    async def slot_async(self, url: str):
+        """
+        slot 的协程版本，名额不足时挂起当前协程而不阻塞事件循环；与 slot 共用每个 host 的上限和观测状态，
+        线程释放名额时不会唤醒等待中的协程，同一个 host 应只在一种引擎中使用
+        """
+        slot = _Slot()
+        if not self.enabled:
+            yield slot
+            return
+
+        state = self._host(url)
+        condition = state.async_condition()
+        async with condition:
+            while True:
+                with state.condition:
+                    if state.in_flight < int(state.limit):
+                        state.in_flight += 1
+                        break
+                await condition.wait()
+        slot.start = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            slot.error = True
+            raise
+        finally:
+            if slot.latency is None:
+                slot.latency = time.monotonic() - slot.start
+            with state.condition:
+                state.in_flight -= 1
+                self._adjust(state, slot)
+                state.condition.notify_all()
+            async with condition:
+                condition.notify_all()
+
+    def _adjust(self, state: _HostLimit, slot: _Slot) -> None:
+        """根据一次请求的结果调整上限"""
+        latency = slot.latency
+        if not slot.error:
+            # 基准缓慢上浮，服务端整体变慢后能重新适应
+            state.baseline = latency if state.baseline is None else min(state.baseline * 1.01, latency)
+        congested = slot.error or (state.baseline is not None and
+                                   latency > state.baseline * self.latency_tolerance)
+        if congested:
+            # 同一批并发请求只减小一次，避免上限被连续的错误压到最小值
+            if slot.start > state.last_backoff:
+                state.limit = max(float(self.min_limit), state.limit * self.backoff)
+                state.last_backoff = time.monotonic()
+        else:
+            state.limit = min(float(self.max_limit), state.limit + 1 / state.limit)
@@ -1,18 +1,89 @@
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import requests
-from typing import Optional
+import urllib3
+from typing import Dict, Iterable, Optional, Tuple
 
+from utils.bandwidth import Bandwidth
+from utils.concurrency_limiter import AdaptiveLimiter
+from utils.http_session import SessionPool
 from utils.toml_reader import ConfigReader
 from utils.mysql_connector import Database
 
+# 请求或读取响应体时可以重试的错误：连接被重置、超时、响应体不完整
+INTERRUPTIONS = (requests.RequestException, urllib3.exceptions.HTTPError, ConnectionError, TimeoutError)
+
+
+class DownloadResult:
+    """下载结果，摘要在写入文件时同步计算，调用方不需要再次读取文件"""
+
+    def __init__(self, path: Optional[str], size: int, md5: Optional[str], sha256: Optional[str] = None):
+        """
+        :param path: 本地文件路径，流式传输时为 None
+        :param size: 文件字节数
+        :param md5: 文件内容的 MD5，分段下载且不需要摘要时为 None
+        :param sha256: 文件内容的 SHA-256，未启用时为 None
+        """
+        self.path = path
+        self.size = size
+        self.md5 = md5
+        self.sha256 = sha256
+
+
+class ContentDigest:
+    """边读写数据块边计算 MD5（可选 SHA-256）和字节数"""
+
+    def __init__(self, sha256: bool = False):
+        self.size = 0
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256() if sha256 else None
+
+    def update(self, chunk) -> None:
+        self.size += len(chunk)
+        self._md5.update(chunk)
+        if self._sha256 is not None:
+            self._sha256.update(chunk)
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterable[bytes]:
+        """在数据块经过时计算摘要"""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def result(self, path: Optional[str] = None) -> DownloadResult:
+        return DownloadResult(path, self.size, self._md5.hexdigest(),
+                              self._sha256.hexdigest() if self._sha256 is not None else None)
+
 
 class DFS:
 
-    def __init__(self):
+    def __init__(self, http: Optional[SessionPool] = None, cache_size: int = 10000,
+                 chunk_size: int = 4 * 1024 * 1024, range_threshold: int = 256 * 1024 * 1024, range_parts: int = 4,
+                 resume_attempts: int = 3, limiter: Optional[AdaptiveLimiter] = None,
+                 bandwidth: Optional[Bandwidth] = None):
         """
         初始化 DFS 模块
+        :param http: 共享的 HTTP 连接池，未指定时按配置创建
+        :param cache_size: 文件ID -> URL 缓存的最大条目数
+        :param chunk_size: 下载时每次读取的字节数，每个线程复用一个该大小的缓冲区
+        :param range_threshold: 文件大于该字节数且服务端支持 Range 时分段并行下载
+        :param range_parts: 分段下载时同时使用的连接数，小于 2 时不分段
+        :param resume_attempts: 下载中断后用 Range 继续下载的最大次数
+        :param limiter: 按 host 自适应调整并发数的限流器，未指定时不限制
+        :param bandwidth: 与上传共用的带宽限制，未指定时不限速
         """
         self.config_reader = ConfigReader("conf/conf.toml")
+        self.http = http or SessionPool(**self.config_reader.get_http_config())
+        self.chunk_size = chunk_size
+        self.range_threshold = range_threshold
+        self.range_parts = range_parts
+        self.resume_attempts = resume_attempts
+        self.limiter = limiter or AdaptiveLimiter(enabled=False)
+        self.bandwidth = bandwidth or Bandwidth()
         mysql_config = self.config_reader.get_mysql_config()
         self.db = Database(
             host=mysql_config['host'],
@@ -21,40 +92,285 @@ class DFS:
             password=mysql_config['password'],
             database='adhere_mfs'
         )
-        self.connection = self.db.connect()
+        # pymysql 连接不是线程安全的，每个工作线程使用自己的连接
+        self._local = threading.local()
+        # 文件ID -> URL 的 LRU 缓存，查询不到的ID缓存为 None
+        self.cache_size = cache_size
+        self._url_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def buffer(self) -> bytearray:
+        """当前线程复用的下载缓冲区"""
+        if getattr(self._local, 'buffer', None) is None:
+            self._local.buffer = bytearray(self.chunk_size)
+        return self._local.buffer
+
+    @property
+    def connection(self):
+        """获取当前线程的数据库连接"""
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = self.db.connect()
+        return self._local.connection
 
     def get_url_by_file_id(self, file_id: int) -> Optional[str]:
         """根据文件ID查询数据库中对应的MD5值"""
+        with self._cache_lock:
+            if file_id in self._url_cache:
+                self._url_cache.move_to_end(file_id)
+                return self._url_cache[file_id]
         sql = "SELECT url FROM t_origin_file WHERE id = %s"
         results = self.db.query(self.connection, sql, (file_id,))
-        if results:
-            return results[0][0]  # 返回 MD5 值
-        return None
+        url = results[0][0] if results else None  # 返回 MD5 值
+        self._cache_urls({file_id: url})
+        return url
+
+    def get_urls_by_file_ids(self, file_ids: Iterable[int], batch_size: int = 1000) -> Dict[int, Optional[str]]:
+        """批量查询文件ID对应的URL，已缓存的ID不再查询，结果写入缓存"""
+        urls = {}
+        missing = []
+        with self._cache_lock:
+            for file_id in dict.fromkeys(file_ids):
+                if file_id in self._url_cache:
+                    self._url_cache.move_to_end(file_id)
+                    urls[file_id] = self._url_cache[file_id]
+                else:
+                    missing.append(file_id)
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            sql = f"SELECT id, url FROM t_origin_file WHERE id IN ({', '.join(['%s'] * len(batch))})"
+            found = dict(self.db.query(self.connection, sql, tuple(batch)))
+            resolved = {file_id: found.get(file_id) for file_id in batch}
+            self._cache_urls(resolved)
+            urls.update(resolved)
+        return urls
+
+    def _cache_urls(self, urls: Dict[int, Optional[str]]) -> None:
+        """写入缓存，超过 cache_size 时淘汰最久未使用的条目"""
+        with self._cache_lock:
+            for file_id, url in urls.items():
+                self._url_cache[file_id] = url
+                self._url_cache.move_to_end(file_id)
+            while len(self._url_cache) > self.cache_size:
+                self._url_cache.popitem(last=False)
+
+    def download_file_by_url(self, url: str, download_path: str, sha256: bool = False,
+                             digest_ranges: bool = True) -> Optional[DownloadResult]:
+        """
+        下载文件，写入的同时计算 MD5 和字节数；请求失败或传输中断时重试，已经写入数据时用 Range 从该位置继续，
+        最多重试 resume_attempts 次
+        :param sha256: 是否同时计算 SHA-256
+        :param digest_ranges: 分段下载后是否再读取一遍文件计算摘要，为 False 时结果中没有摘要
+        :return: 下载结果，失败时返回 None
+        """
+        digest = ContentDigest(sha256)
+        written, length = 0, None
+        opened = split = False
+        resumable = interrupted = True
+        for attempt in range(self.resume_attempts + 1):
+            if attempt and opened:
+                if not resumable:
+                    break
+                print(f"Resume download from byte {written}: {url}")
+            headers = {'Range': f'bytes={written}-'} if opened else None
+            # 读完或关闭响应后连接才会回到连接池；整个传输过程占用 gofast 的一个并发名额
+            with self.limiter.slot(url) as slot:
+                response = self._open(slot, url, headers)
+                if response is None:
+                    continue
+                with response:
+                    slot.observe(response)
+                    if opened:
+                        if response.status_code != 206:
+                            print(f"Failed to resume download: {response.status_code}")
+                            break
+                    else:
+                        if response.status_code != 200:
+                            print(f"Failed to download file: {response.status_code}")
+                            return None
+                        # 保存文件到本地
+                        os.makedirs(os.path.dirname(download_path), exist_ok=True)
+                        length = self.content_length(response)
+                        if self._can_split(response, length):
+                            # 不读取这个响应，改为多个 Range 请求并行下载，每段各自占用并发名额
+                            split = True
+                            break
+                        resumable = self.accept_ranges(response)
+                        with open(download_path, 'wb') as file:
+                            if length:
+                                self.preallocate(file, length)
+                        opened = True
+                    with open(download_path, 'r+b') as file:
+                        file.seek(written)
+                        size, interrupted = self._copy_resumable(response, file, digest)
+                    written += size
+            if not interrupted and (length is None or written >= length):
+                break
+
+        if split:
+            return self.download_ranges(url, download_path, length, sha256, digest_ranges)
+        if interrupted or (length is not None and written != length):
+            print(f"Incomplete download: {written}/{length} bytes")
+            return None
+        print(f"File downloaded successfully to {download_path}")
+        return digest.result(download_path)
+
+    def _open(self, slot, url: str, headers: Optional[dict] = None) -> Optional[requests.Response]:
+        """发起流式 GET，连接被重置或超时时记为出错并返回 None，由调用方计入重试次数"""
+        try:
+            return self.http.get(url, stream=True, headers=headers)
+        except INTERRUPTIONS as e:
+            slot.error = True
+            print(f"Download request failed: {e}")
+            return None
+
+    def _copy_resumable(self, response: requests.Response, file,
+                        digest: Optional[ContentDigest] = None) -> Tuple[int, bool]:
+        """
+        写入响应体，连接中断时保留已写入的数据
+        :return: (写入的字节数, 是否中断)
+        """
+        start = file.tell()
+        try:
+            self.copy_response(response, file, digest)
+            interrupted = False
+        except INTERRUPTIONS as e:
+            print(f"Download interrupted: {e}")
+            interrupted = True
+        return file.tell() - start, interrupted
+
+    @staticmethod
+    def accept_ranges(response: requests.Response) -> bool:
+        """服务端是否支持按字节 Range 请求"""
+        return response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+
+    def _can_split(self, response: requests.Response, length: Optional[int]) -> bool:
+        """文件足够大并且服务端声明支持 Range 时分段下载"""
+        return (self.range_parts > 1 and length is not None and length >= self.range_threshold
+                and self.accept_ranges(response))
+
+    def download_ranges(self, url: str, download_path: str, length: int, sha256: bool = False,
+                        digest: bool = True) -> Optional[DownloadResult]:
+        """
+        把文件按 Range 分成 range_parts 段，多个连接同时下载并写入各自的偏移位置
+        :param length: 文件总字节数
+        :param digest: 是否读取下载后的文件计算摘要，为 False 时只返回路径和字节数
+        :return: 下载结果，任一段失败时返回 None
+        """
+        part_size = -(-length // self.range_parts)
+        ranges = [(start, min(start + part_size, length) - 1) for start in range(0, length, part_size)]
+        with open(download_path, 'wb') as file:
+            self.preallocate(file, length)
+            file.truncate(length)
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            results = list(executor.map(lambda item: self._download_range(url, download_path, *item), ranges))
+        if not all(results):
+            print(f"Failed to download file by range: {url}")
+            return None
+
+        print(f"File downloaded successfully to {download_path}")
+        if not digest:
+            return DownloadResult(download_path, length, None)
+        # MD5 只能按顺序计算，分段写入后需要再读取一遍整个文件，文件不在页缓存中时相当于再读一次磁盘
+        return self.digest_file(download_path, sha256)
+
+    def _download_range(self, url: str, download_path: str, start: int, end: int) -> bool:
+        """下载 [start, end] 字节并写入文件的对应位置，中断时从已写入的位置继续"""
+        position = start
+        for _ in range(self.resume_attempts + 1):
+            with self.limiter.slot(url) as slot:
+                response = self._open(slot, url, {'Range': f'bytes={position}-{end}'})
+                if response is None:
+                    continue
+                with response:
+                    slot.observe(response)
+                    if response.status_code != 206:
+                        print(f"Failed to download range {position}-{end}: {response.status_code}")
+                        return False
+                    with open(download_path, 'r+b') as file:
+                        file.seek(position)
+                        written, _ = self._copy_resumable(response, file)
+            position += written
+            if position > end:
+                return True
+        return False
+
+    def digest_file(self, file_path: str, sha256: bool = False) -> DownloadResult:
+        """读取本地文件计算摘要"""
+        digest = ContentDigest(sha256)
+        buffer = self.buffer
+        view = memoryview(buffer)
+        with open(file_path, 'rb') as file:
+            while size := file.readinto(buffer):
+                digest.update(view[:size])
+        return digest.result(file_path)
+
+    @contextmanager
+    def open_stream(self, url: str):
+        """
+        打开下载响应但不写入本地文件，由调用方在 with 块内读取，下载失败时得到 None
+        响应被读取期间一直占用 gofast 的一个并发名额，退出 with 块时关闭响应并释放名额
+        """
+        with self.limiter.slot(url) as slot:
+            response = self._open(slot, url)
+            if response is None:
+                yield None
+                return
+            with response:
+                slot.observe(response)
+                if response.status_code != 200:
+                    print(f"Failed to download file: {response.status_code}")
+                    yield None
+                    return
+                yield response
+
+    def copy_response(self, response: requests.Response, file, digest: Optional[ContentDigest] = None) -> int:
+        """
+        用 readinto 把响应体读入线程复用的缓冲区再写入文件，避免每个数据块创建新的 bytes 对象
+        :return: 写入的字节数
+        """
+        buffer = self.buffer
+        view = memoryview(buffer)
+        raw = response.raw
+        raw.decode_content = True
+        written = 0
+        while True:
+            size = raw.readinto(buffer)
+            if not size:
+                break
+            file.write(view[:size])
+            if digest is not None:
+                digest.update(view[:size])
+            written += size
+            self.bandwidth.throttle('download', size)
+        return written
 
     @staticmethod
-    def download_file_by_url(url: str, download_path: str) -> bool:
-        """通过 MD5 值下载文件"""
-        response = requests.get(url, stream=True)
-
-        if response.status_code == 200:
-            # 保存文件到本地
-            os.makedirs(os.path.dirname(download_path), exist_ok=True)
-            with open(download_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        file.write(chunk)
-            print(f"File downloaded successfully to {download_path}")
-            return True
-        else:
-            print(f"Failed to download file: {response.status_code}")
-            return False
-
-    def dfs(self, file_id: int, download_path: str) -> bool:
+    def preallocate(file, length: int) -> None:
+        """按 Content-Length 预先分配文件空间，减少写入时的碎片和元数据更新"""
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(file.fileno(), 0, length)
+            except OSError:
+                # 部分文件系统不支持 fallocate
+                pass
+
+    @staticmethod
+    def content_length(response: requests.Response) -> Optional[int]:
+        """返回响应体的长度，压缩传输时 Content-Length 与解压后的长度不一致，返回 None"""
+        length = response.headers.get('Content-Length')
+        if length is None or response.headers.get('Content-Encoding'):
+            return None
+        return int(length)
+
+    def dfs(self, file_id: int, download_path: str) -> Optional[DownloadResult]:
         """根据文件ID查询URL并下载文件"""
         url = self.get_url_by_file_id(file_id)
         if not url:
             print(f"File with ID {file_id} not found in database.")
-            return False
+            return None
 
         # 使用查询到的 url 值下载文件
         return self.download_file_by_url(url, download_path)
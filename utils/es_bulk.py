@@ -0,0 +1,89 @@
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, List, Optional
+
+from elasticsearch import helpers
+
+
+class BulkUpdater:
+    """缓冲 Elasticsearch 的部分更新，每 batch_size 个文档或 flush_interval 秒通过 bulk API 提交一次"""
+
+    def __init__(self, es, index: str, batch_size: int = 500, flush_interval: float = 5,
+                 max_bytes: int = 10 * 1024 * 1024, on_error: Optional[Callable[[Any, Any], None]] = None,
+                 stage: Optional[Callable[[str], ContextManager]] = None):
+        """
+        :param es: Elasticsearch 客户端
+        :param index: 索引名称
+        :param batch_size: 缓冲的文档数达到该值时提交
+        :param flush_interval: 距上次提交超过该秒数时提交
+        :param max_bytes: 单个 bulk 请求的最大字节数，超过时拆分为多个请求
+        :param on_error: 文档更新失败时调用，参数为 (文档ID, 错误信息)
+        :param stage: 设置时用 stage('es_update') 记录每次提交的耗时，例如 Metrics.stage
+        """
+        self.es = es
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.on_error = on_error
+        self.stage = stage
+        self.updated = 0
+        self.failed = 0
+        self._pending: List[dict] = []
+        self._last_flush = time.monotonic()
+        self._refresh_interval = None
+
+    def update(self, doc_id: Any, doc: dict) -> None:
+        """加入一个文档的部分更新"""
+        self._pending.append({'_op_type': 'update', '_index': self.index, '_id': doc_id, 'doc': doc})
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """提交缓冲中的所有更新，逐个报告失败的文档"""
+        actions, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        if not actions:
+            return
+        try:
+            with self.stage('es_update') if self.stage else nullcontext():
+                success, errors = self._bulk(actions)
+        except Exception as e:
+            # 整个请求失败（连接错误等），这一批文档都没有更新
+            self.failed += len(actions)
+            for action in actions:
+                self._report(action['_id'], str(e))
+            return
+        self.updated += success
+        self.failed += len(errors)
+        for error in errors:
+            item = error.get('update', error)
+            self._report(item.get('_id'), item.get('error', item))
+
+    def _bulk(self, actions: List[dict]):
+        return helpers.bulk(self.es, actions, chunk_size=self.batch_size, max_chunk_bytes=self.max_bytes,
+                            raise_on_error=False, raise_on_exception=False)
+
+    def _report(self, doc_id: Any, error: Any) -> None:
+        if self.on_error is not None:
+            self.on_error(doc_id, error)
+
+    def disable_refresh(self) -> bool:
+        """
+        暂停索引的定时刷新，记录原来的 refresh_interval，大量更新期间不再反复生成新的 segment
+        :return: 刷新已经被暂停（例如另一个分片进程先启动）时返回 False，此时不应该由当前进程恢复
+        """
+        settings = self.es.indices.get_settings(index=self.index, name='index.refresh_interval')
+        self._refresh_interval = (settings.get(self.index, {}).get('settings', {})
+                                  .get('index', {}).get('refresh_interval'))
+        if self._refresh_interval == '-1':
+            return False
+        self.es.indices.put_settings(index=self.index, body={'index': {'refresh_interval': '-1'}})
+        return True
+
+    def restore_refresh(self) -> None:
+        """恢复原来的 refresh_interval（未设置过时恢复为默认值）并立即刷新一次"""
+        if self._refresh_interval != '-1':
+            self.es.indices.put_settings(index=self.index,
+                                         body={'index': {'refresh_interval': self._refresh_interval}})
+        self.es.indices.refresh(index=self.index)
@@ -0,0 +1,56 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    """按 host 共享的 requests.Session，复用 keep-alive 连接，避免每个文件都重新建立 TCP 连接"""
+
+    def __init__(self, pool_size: int = 32, keep_alive: bool = True, connect_timeout: float = 10,
+                 read_timeout: float = 300):
+        """
+        :param pool_size: 每个 host 保持的最大连接数
+        :param keep_alive: 是否复用连接，关闭时每个请求后断开连接
+        :param connect_timeout: 建立连接的超时时间（秒）
+        :param read_timeout: 两次读取数据之间的超时时间（秒）
+        """
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url: str) -> requests.Session:
+        """获取 url 所在 host 的共享 Session"""
+        parts = urlsplit(url)
+        host = f'{parts.scheme}://{parts.netloc}'
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    # 连接用完时等待空闲连接，而不是创建不会被复用的临时连接
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+                    session.mount(host, adapter)
+                    if not self.keep_alive:
+                        session.headers['Connection'] = 'close'
+                    self._sessions[host] = session
+        return session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session(url).get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session(url).post(url, **kwargs)
+
+    def close(self) -> None:
+        """关闭所有 Session"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
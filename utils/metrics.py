@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, Optional
+
+from utils.tracing import Tracer
+
+# 延迟直方图的上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+
+class _Stage:
+    """单个阶段的累计值"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def observe(self, seconds: float, size: int, error: bool) -> None:
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += size
+        if error:
+            self.errors += 1
+
+
+class StageTimer:
+    """一次阶段执行的计时，在 with 块中设置 size 记录传输的字节数，设置 error 标记失败"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.size = 0
+        self.error = False
+
+
+class Metrics:
+    """按阶段统计延迟直方图、字节数和进行中的数量，导出为 Prometheus 文本格式"""
+
+    def __init__(self, converter: str, enabled: bool = True, textfile: str = '', port: int = 0,
+                 interval: float = 10, buckets: tuple = DEFAULT_BUCKETS, tracer: Optional[Tracer] = None):
+        """
+        :param converter: 转换器名称，作为指标的 converter 标签
+        :param enabled: 关闭时不记录任何指标
+        :param textfile: 定期写入的 Prometheus 文本文件路径（node_exporter textfile 格式），为空时不写
+        :param port: 在 127.0.0.1 上提供 /metrics 的端口，0 表示不启动
+        :param interval: 写文本文件的间隔（秒）
+        :param buckets: 延迟直方图的上界（秒）
+        :param tracer: 设置时同时把每次阶段执行记录到 trace 文件
+        """
+        self.converter = converter
+        self.enabled = enabled
+        self.textfile = textfile
+        self.port = port
+        self.interval = interval
+        self.buckets = tuple(buckets)
+        self.tracer = tracer
+        self.started = time.monotonic()
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+        self._server = None
+
+    def _stage(self, name: str) -> _Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self.buckets)
+        return stage
+
+    @contextmanager
+    def stage(self, name: str, row_id: Any = None):
+        """
+        记录 with 块的耗时，抛出异常时计为失败
+        :param row_id: 所属行的ID，只用于 trace
+        """
+        timer = StageTimer()
+        if not self.enabled and self.tracer is None:
+            yield timer
+            return
+        if self.enabled:
+            with self._lock:
+                self._stage(name).in_flight += 1
+        try:
+            yield timer
+        except BaseException:
+            timer.error = True
+            raise
+        finally:
+            seconds = time.monotonic() - timer.start
+            if self.enabled:
+                with self._lock:
+                    stage = self._stage(name)
+                    stage.in_flight -= 1
+                    stage.observe(seconds, timer.size, timer.error)
+            if self.tracer is not None:
+                self.tracer.span(name, timer.start, seconds, row_id, timer.size, timer.error)
+
+    def observe(self, name: str, seconds: float, size: int = 0, error: bool = False) -> None:
+        """直接记录一次观测值"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._stage(name).observe(seconds, size, error)
+
+    def timed_iter(self, name: str, items: Iterable) -> Iterable:
+        """记录每次从 items 取下一项的等待时间，用于统计流式查询"""
+        iterator = iter(items)
+        while True:
+            start = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, time.monotonic() - start)
+            yield item
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式"""
+        label = f'converter="{self.converter}"'
+        lines = [
+            '# HELP converter_stage_seconds Latency of each converter stage.',
+            '# TYPE converter_stage_seconds histogram',
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, stage in stages:
+                labels = f'{label},stage="{name}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, stage.counts):
+                    cumulative += count
+                    lines.append(f'converter_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'converter_stage_seconds_bucket{{{labels},le="+Inf"}} {stage.count}')
+                lines.append(f'converter_stage_seconds_sum{{{labels}}} {stage.seconds:.6f}')
+                lines.append(f'converter_stage_seconds_count{{{labels}}} {stage.count}')
+            for metric, kind, help_text, attr in (
+                    ('converter_stage_bytes_total', 'counter', 'Bytes transferred by each stage.', 'bytes'),
+                    ('converter_stage_errors_total', 'counter', 'Failed executions of each stage.', 'errors'),
+                    ('converter_stage_in_flight', 'gauge', 'Executions of each stage in progress.', 'in_flight')):
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} {kind}')
+                for name, stage in stages:
+                    lines.append(f'{metric}{{{label},stage="{name}"}} {getattr(stage, attr)}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """运行结束时的汇总：每个阶段的次数、失败数、平均和 P50/P95/P99 延迟、吞吐量"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        lines = [f'{"stage":<14}{"count":>9}{"errors":>8}{"avg(s)":>10}{"p50(s)":>10}{"p95(s)":>10}'
+                 f'{"p99(s)":>10}{"MB":>12}{"MB/s":>10}']
+        with self._lock:
+            for name, stage in sorted(self._stages.items()):
+                average = stage.seconds / stage.count if stage.count else 0
+                megabytes = stage.bytes / (1024 * 1024)
+                lines.append(f'{name:<14}{stage.count:>9}{stage.errors:>8}{average:>10.3f}'
+                             f'{self._quantile(stage, 0.5):>10}{self._quantile(stage, 0.95):>10}'
+                             f'{self._quantile(stage, 0.99):>10}{megabytes:>12.1f}{megabytes / elapsed:>10.2f}')
+        lines.append(f'elapsed: {elapsed:.1f}s')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _quantile(stage: _Stage, q: float) -> str:
+        """按直方图估计分位数，返回所在桶的上界"""
+        if not stage.count:
+            return '-'
+        target = q * stage.count
+        cumulative = 0
+        for bound, count in zip(stage.buckets, stage.counts):
+            cumulative += count
+            if cumulative >= target:
+                return f'<={bound}'
+        return f'>{stage.buckets[-1]}'
+
+    def write_textfile(self) -> None:
+        """写入文本文件，先写临时文件再替换，读取方不会看到写了一半的内容"""
+        os.makedirs(os.path.dirname(self.textfile) or '.', exist_ok=True)
+        temp_path = f'{self.textfile}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(self.render())
+        os.replace(temp_path, self.textfile)
+
+    def start(self) -> None:
+        """按配置启动定期写文件的线程和本地 HTTP 端点"""
+        if self.tracer is not None:
+            self.tracer.start()
+        if not self.enabled:
+            return
+        self.started = time.monotonic()
+        if self.textfile:
+            self._writer = threading.Thread(target=self._write_loop, name=f'{self.converter}-metrics', daemon=True)
+            self._writer.start()
+        if self.port:
+            self._server = ThreadingHTTPServer(('127.0.0.1', self.port), self._handler())
+            threading.Thread(target=self._server.serve_forever, name=f'{self.converter}-metrics-http',
+                             daemon=True).start()
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write_textfile()
+
+    def _handler(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 不在终端输出访问日志
+                pass
+
+        return Handler
+
+    def stop(self) -> Optional[str]:
+        """停止导出，写入最后一次文本文件，返回汇总"""
+        if self.tracer is not None:
+            path = self.tracer.close()
+            if path is not None:
+                print(f"Trace written to {path}")
+        if not self.enabled:
+            return None
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+        if self.textfile:
+            self.write_textfile()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        return self.summary()
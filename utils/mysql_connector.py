@@ -1,5 +1,8 @@
+import time
+
 import pymysql
-from typing import Tuple, Any
+from pymysql.cursors import SSCursor
+from typing import Tuple, Any, Iterator, Optional, Callable
 
 
 class Database:
@@ -11,15 +14,16 @@ class Database:
         self.password = password
         self.database = database
 
-    def connect(self):
-        """建立数据库连接"""
+    def connect(self, **kwargs):
+        """建立数据库连接，kwargs 传给 pymysql.connect，例如 cursorclass"""
         return pymysql.connect(
             host=self.host,
             port=self.port,
             user=self.user,
             password=self.password,
             database=self.database,
-            charset='utf8mb4'
+            charset='utf8mb4',
+            **kwargs
         )
 
     @staticmethod
@@ -36,3 +40,126 @@ class Database:
         with connection.cursor() as cursor:
             cursor.execute(sql, params)
             connection.commit()
+
+    @staticmethod
+    def iter_query(connection, columns: str, table: str, where: str = '', params: Tuple = (),
+                   batch_size: int = 1000, key: str = 'id') -> Iterator[Tuple[Any, ...]]:
+        """
+        按主键分页（keyset）逐批查询，内存中只保留一页数据
+        :param columns: 查询的列，第一列必须是 key
+        :param table: 表名
+        :param where: 额外的查询条件
+        :param params: where 中的参数
+        :param batch_size: 每页的行数
+        :param key: 分页使用的主键列
+        """
+        last_key = None
+        while True:
+            conditions = [f'({where})'] if where else []
+            page_params = list(params)
+            if last_key is not None:
+                conditions.append(f'{key} > %s')
+                page_params.append(last_key)
+            sql = f'SELECT {columns} FROM {table}'
+            if conditions:
+                sql += ' WHERE ' + ' AND '.join(conditions)
+            sql += f' ORDER BY {key} LIMIT %s'
+            page_params.append(batch_size)
+
+            rows = Database.query(connection, sql, tuple(page_params))
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_key = rows[-1][0]
+
+    def iter_ordered(self, columns: str, table: str, where: str = '', params: Tuple = (), order_by: str = 'id',
+                     batch_size: int = 1000, write_timeout: int = 86400) -> Iterator[Tuple[Any, ...]]:
+        """
+        在单独的连接上用服务端游标（SSCursor）执行一次排序查询并逐批读取，内存中只保留一批数据；
+        适合 order_by 上没有索引、按页查询每页都要全表扫描和排序的情况
+        :param order_by: 排序的列，可以是多个列
+        :param batch_size: 每次从游标读取的行数
+        :param write_timeout: 调用方处理得慢时服务端等待读取的秒数（net_write_timeout），超过后服务端断开连接
+        """
+        connection = self.connect(cursorclass=SSCursor)
+        cursor = connection.cursor()
+        finished = False
+        try:
+            cursor.execute('SET SESSION net_write_timeout = %s', (write_timeout,))
+            sql = f'SELECT {columns} FROM {table}'
+            if where:
+                sql += f' WHERE {where}'
+            cursor.execute(sql + f' ORDER BY {order_by}', params)
+            while rows := cursor.fetchmany(batch_size):
+                yield from rows
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+                connection.close()
+            else:
+                # 调用方提前停止（收到停止信号、迁移中断）时，关闭服务端游标会把剩余的整个结果集读完才返回；
+                # 直接断开连接让服务端停止发送，游标与连接解除关联后不再读取
+                connection.close()
+                cursor.connection = None
+
+    @staticmethod
+    def count(connection, table: str, where: str = '', params: Tuple = ()) -> int:
+        """查询满足条件的行数"""
+        sql = f'SELECT COUNT(*) FROM {table}'
+        if where:
+            sql += f' WHERE {where}'
+        return Database.query(connection, sql, params)[0][0]
+
+
+class BatchWriter:
+    """缓冲更新语句，按 executemany 批量执行，每 batch_size 行或 flush_interval 秒提交一次"""
+
+    def __init__(self, connection, batch_size: int = 500, flush_interval: float = 5,
+                 on_flush: Optional[Callable[[], None]] = None):
+        """
+        :param connection: 数据库连接，只能在创建 BatchWriter 的线程中使用
+        :param batch_size: 缓冲的行数达到该值时提交
+        :param flush_interval: 距上次提交超过该秒数时提交
+        :param on_flush: 每次数据库提交成功后调用
+        """
+        self.connection = connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self._pending = {}
+        self._count = 0
+        self._last_flush = time.monotonic()
+
+    def execute(self, sql: str, params: Tuple = ()) -> None:
+        """加入一条更新语句，相同的 SQL 合并为一次 executemany"""
+        self._pending.setdefault(sql, []).append(params)
+        self._count += 1
+        if self._count >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_timeout(self) -> Optional[float]:
+        """距按时间提交还有多少秒，缓冲为空时返回 None"""
+        if not self._pending:
+            return None
+        return max(self._last_flush + self.flush_interval - time.monotonic(), 0)
+
+    def flush_if_due(self) -> None:
+        """距上次提交超过 flush_interval 秒时提交，等待传输结果的循环中也要定期调用，没有新行完成时缓冲同样会被提交"""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """执行缓冲中的所有语句并提交"""
+        if self._pending:
+            with self.connection.cursor() as cursor:
+                for sql, params_list in self._pending.items():
+                    cursor.executemany(sql, params_list)
+            self.connection.commit()
+            self._pending = {}
+            self._count = 0
+            if self.on_flush:
+                self.on_flush()
+        self._last_flush = time.monotonic()
@@ -0,0 +1,227 @@
+"""
+把一个转换器的源表拆分到多个进程执行，每个进程有自己的数据库连接和 HTTP 连接池，父进程汇总进度和失败
+
+在仓库根目录执行，例如：
+    python -m utils.sharding success_file_converter --shards 8
+多台机器处理同一张表时，所有机器使用相同的 --shards 和 --mode，各自运行一部分分片：
+    python -m utils.sharding success_file_converter --shards 8 --indexes 0-3   # 机器 A
+    python -m utils.sharding success_file_converter --shards 8 --indexes 4-7   # 机器 B
+range 方式下分片边界由 key 的 MIN/MAX 计算，第一台机器启动时会打印使用的边界，其他机器需要通过 --bounds 使用
+相同的边界，否则先后启动的机器看到的 MIN/MAX 不同，分片之间会有遗漏或重叠：
+    python -m utils.sharding video_converter --shards 8 --mode range --indexes 0-3                   # 机器 A
+    python -m utils.sharding video_converter --shards 8 --mode range --indexes 4-7 --bounds 1:980000 # 机器 B
+"""
+import argparse
+import importlib
+import multiprocessing
+import queue
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from tqdm import tqdm
+
+from utils.toml_reader import ConfigReader
+
+
+class Shard:
+    """源表的一个分片：mod 按 key % count == index 划分，range 把 key 的取值范围等分为 count 段"""
+
+    MODES = ('mod', 'range')
+
+    def __init__(self, index: int, count: int, mode: str = 'mod', bounds: Optional[Tuple[int, int]] = None):
+        """
+        :param bounds: range 方式下 key 的 (最小值, 最大值)，所有分片必须相同；为 None 时在 condition 中查询
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'unknown shard mode: {mode}')
+        if not 0 <= index < count:
+            raise ValueError(f'shard index {index} out of range 0..{count - 1}')
+        self.index = index
+        self.count = count
+        self.mode = mode
+        self.bounds = bounds
+
+    def __str__(self):
+        return f'shard{self.index}of{self.count}'
+
+    def condition(self, db, connection, table: str, key: str) -> Tuple[str, tuple]:
+        """
+        返回该分片的查询条件和参数，与 Database.iter_query / count 的 where 参数配合使用
+        :param key: 分片使用的整数列，同一组需要一起处理的行必须有相同的 key
+        """
+        if self.mode == 'mod':
+            # pymysql 有参数时用 % 格式化 SQL，取模运算符需要写成 %%
+            return f'{key} %% %s = %s', (self.count, self.index)
+        bounds = self.bounds or self.key_bounds(db, connection, table, key)
+        if bounds is None:
+            return '1 = 0', ()
+        low, high = bounds
+        span = high - low + 1
+        # 第一段和最后一段不设下限和上限，边界确定之后新增的行也会被处理
+        conditions, params = [], []
+        if self.index > 0:
+            conditions.append(f'{key} >= %s')
+            params.append(low + span * self.index // self.count)
+        if self.index < self.count - 1:
+            conditions.append(f'{key} < %s')
+            params.append(low + span * (self.index + 1) // self.count)
+        return ' AND '.join(conditions) or '1 = 1', tuple(params)
+
+    @staticmethod
+    def key_bounds(db, connection, table: str, key: str) -> Optional[Tuple[int, int]]:
+        """key 的 (最小值, 最大值)，表为空时返回 None"""
+        low, high = db.query(connection, f'SELECT MIN({key}), MAX({key}) FROM {table}')[0]
+        return None if low is None else (low, high)
+
+
+class ShardProgress:
+    """子进程中代替 tqdm 的进度条，把进度合并后发送给父进程"""
+
+    def __init__(self, messages, index: int, total: int, interval: float = 0.5):
+        self.messages = messages
+        self.index = index
+        self.interval = interval
+        self._pending = 0
+        self._last = time.monotonic()
+        messages.put(('total', index, total))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def update(self, n: int = 1) -> None:
+        self._pending += n
+        if time.monotonic() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self.messages.put(('progress', self.index, self._pending))
+            self._pending = 0
+        self._last = time.monotonic()
+
+
+def load_converter(name: str):
+    """按 name 属性查找转换器类"""
+    from converter.abstract_converter import AbstractConverter
+
+    module = importlib.import_module(f'converter.{name}')
+    for value in vars(module).values():
+        if isinstance(value, type) and issubclass(value, AbstractConverter) and value.name == name:
+            return value
+    raise ValueError(f'converter not found: {name}')
+
+
+def _run_shard(name: str, index: int, count: int, mode: str, bounds: Optional[Tuple[int, int]], messages) -> None:
+    """子进程入口"""
+    error = None
+    converter = None
+    try:
+        converter = load_converter(name)()
+        # 带宽限制是整个网络的上限，所有分片（包括在其他机器上运行的）平分
+        converter.bandwidth.share(count)
+        completed = converter.convert(Shard(index, count, mode, bounds),
+                                      lambda total: ShardProgress(messages, index, total))
+        # convert 自己记录并处理异常，中断时通过返回值和 error 报告
+        if not completed:
+            error = converter.error or 'stopped'
+    except BaseException as e:
+        error = repr(e)
+    messages.put(('done', index, converter.failed_rows if converter else 0, error))
+
+
+def parse_indexes(value: str, count: int) -> List[int]:
+    """解析 0,2,4-7 这样的分片编号，为空时返回全部分片"""
+    if not value:
+        return list(range(count))
+    indexes = []
+    for part in value.split(','):
+        start, _, end = part.partition('-')
+        indexes.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(indexes))
+
+
+def range_bounds(name: str) -> Optional[Tuple[int, int]]:
+    """查询转换器源表 shard_key 的 (最小值, 最大值)"""
+    converter = load_converter(name)()
+    connection = converter.db.connect()
+    try:
+        return Shard.key_bounds(converter.db, connection, converter.table, converter.shard_key)
+    finally:
+        connection.close()
+
+
+def run_sharded(name: str, count: int, mode: str = 'mod', indexes: List[int] = None,
+                bounds: Optional[Tuple[int, int]] = None) -> bool:
+    """
+    在本机启动 indexes 中的分片，每个分片一个进程，等待全部结束
+    :param bounds: range 方式下所有分片共用的 key 范围，为 None 时在启动子进程之前查询一次
+    :return: 所有分片都正常结束且没有失败的行时返回 True
+    """
+    indexes = list(range(count)) if indexes is None else indexes
+    if mode == 'range' and bounds is None:
+        bounds = range_bounds(name)
+        if bounds is not None:
+            print(f'range bounds: {bounds[0]}:{bounds[1]} (use --bounds {bounds[0]}:{bounds[1]} on other hosts)')
+    # 转换器会创建线程，使用 spawn 避免 fork 复制父进程中的锁
+    context = multiprocessing.get_context('spawn')
+    messages = context.Queue()
+    processes = {}
+    for index in indexes:
+        process = context.Process(target=_run_shard, args=(name, index, count, mode, bounds, messages),
+                                  name=f'{name}-shard{index}')
+        process.start()
+        processes[index] = process
+
+    results = {}
+    with tqdm(total=0, desc=f'{name} x{len(indexes)}', unit='file') as pbar:
+        while len(results) < len(processes):
+            try:
+                kind, index, *values = messages.get(timeout=1)
+            except queue.Empty:
+                # 子进程被杀死时不会发送 done
+                for index, process in processes.items():
+                    if index not in results and not process.is_alive() and process.exitcode != 0:
+                        results[index] = (0, f'exit code {process.exitcode}')
+                continue
+            if kind == 'total':
+                pbar.total += values[0]
+                pbar.refresh()
+            elif kind == 'progress':
+                pbar.update(values[0])
+            else:
+                results[index] = tuple(values)
+    for process in processes.values():
+        process.join()
+
+    success = True
+    for index in indexes:
+        failed, error = results[index]
+        status = f'error: {error}' if error else 'ok'
+        print(f'shard {index}/{count}: failed rows {failed}, {status}')
+        success = success and not failed and not error
+    return success
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='多进程分片运行转换器')
+    parser.add_argument('converter', help='转换器名称，例如 success_file_converter')
+    parser.add_argument('--shards', type=int, help='分片总数，默认使用 converter.shards')
+    parser.add_argument('--mode', choices=Shard.MODES, help='分片方式，默认使用 converter.shard_mode')
+    parser.add_argument('--indexes', default='', help='本机运行的分片编号，例如 0-3 或 0,2,4，默认全部')
+    parser.add_argument('--bounds', default='', help='range 方式下 key 的范围 最小值:最大值，多台机器必须相同，默认查询源表')
+    args = parser.parse_args()
+
+    converter_config = ConfigReader('conf/conf.toml').get_converter_config(args.converter)
+    count = args.shards or converter_config['shards']
+    mode = args.mode or converter_config['shard_mode']
+    bounds = tuple(int(value) for value in args.bounds.split(':')) if args.bounds else None
+    success = run_sharded(args.converter, count, mode, parse_indexes(args.indexes, count), bounds)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
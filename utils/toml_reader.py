@@ -24,6 +24,7 @@ class ConfigReader:
             'fs_client_api': fs_config.get('fs_client_api', ''),
             'default_space_id': fs_config.get('default_space_id', 1),
             'fs_read_bucket': fs_config.get('fs_read_bucket', ''),
+            'upload_chunk_size': int(fs_config.get('upload_chunk_size', 1024 * 1024)),
         }
 
     def get_mysql_config(self):
@@ -40,6 +41,98 @@ class ConfigReader:
         """获取 gofast 配置"""
         return self.config_data.get('gofast', {}).get('host')
 
+    def get_es_config(self):
+        """获取 Elasticsearch 配置"""
+        es_config = self.config_data.get('es', {})
+        return {
+            'host': f"http://{es_config.get('host', '127.0.0.1')}:{es_config.get('port', 9200)}",
+            'bulk_size': int(es_config.get('bulk_size', 500)),
+            'bulk_interval': float(es_config.get('bulk_interval', 5)),
+            'bulk_max_bytes': int(es_config.get('bulk_max_bytes', 10 * 1024 * 1024)),
+            'disable_refresh': bool(es_config.get('disable_refresh', False)),
+        }
+
+    def get_http_config(self):
+        """获取 HTTP 连接池配置"""
+        http_config = self.config_data.get('http', {})
+        return {
+            'pool_size': int(http_config.get('pool_size', 32)),
+            'keep_alive': bool(http_config.get('keep_alive', True)),
+            'connect_timeout': float(http_config.get('connect_timeout', 10)),
+            'read_timeout': float(http_config.get('read_timeout', 300)),
+        }
+
+    def get_limiter_config(self):
+        """获取按 host 自适应并发限流的配置"""
+        limiter_config = self.config_data.get('limiter', {})
+        return {
+            'enabled': bool(limiter_config.get('enabled', True)),
+            'initial': int(limiter_config.get('initial', 8)),
+            'min_limit': int(limiter_config.get('min_limit', 1)),
+            'max_limit': int(limiter_config.get('max_limit', 64)),
+            'latency_tolerance': float(limiter_config.get('latency_tolerance', 2.0)),
+            'backoff': float(limiter_config.get('backoff', 0.7)),
+        }
+
+    def get_bandwidth_config(self):
+        """获取带宽限制配置，速率单位为字节/秒，0 表示不限制"""
+        bandwidth_config = self.config_data.get('bandwidth', {})
+        return {
+            'rate': float(bandwidth_config.get('rate', 0)),
+            'download_rate': float(bandwidth_config.get('download_rate', 0)),
+            'upload_rate': float(bandwidth_config.get('upload_rate', 0)),
+            'burst': float(bandwidth_config.get('burst', 1.0)),
+            'schedule': bandwidth_config.get('schedule', []),
+        }
+
+    def get_metrics_config(self, name: str):
+        """获取指标导出配置，textfile 中的 {name} 替换为转换器名称"""
+        metrics_config = self.config_data.get('metrics', {})
+        return {
+            'enabled': bool(metrics_config.get('enabled', True)),
+            'textfile': metrics_config.get('textfile', '').format(name=name),
+            'port': int(metrics_config.get('port', 0)),
+            'interval': float(metrics_config.get('interval', 10)),
+        }
+
+    def get_trace_config(self, name: str):
+        """获取 trace 配置，path 中的 {name} 替换为转换器名称"""
+        trace_config = self.config_data.get('trace', {})
+        return {
+            'enabled': bool(trace_config.get('enabled', False)),
+            'path': trace_config.get('path', 'traces/{name}.json').format(name=name),
+        }
+
+    def get_converter_config(self, name: str):
+        """获取转换器配置，[converter.<name>] 中的配置覆盖 [converter] 中的默认值"""
+        converter_config = dict(self.config_data.get('converter', {}))
+        override = converter_config.pop(name, {})
+        converter_config = {key: value for key, value in converter_config.items() if not isinstance(value, dict)}
+        converter_config.update(override)
+        return {
+            'workers': int(converter_config.get('workers', 8)),
+            'engine': converter_config.get('engine', 'thread'),
+            'concurrency': int(converter_config.get('concurrency', 200)),
+            'streaming': bool(converter_config.get('streaming', False)),
+            'sha256': bool(converter_config.get('sha256', False)),
+            'download_chunk_size': int(converter_config.get('download_chunk_size', 4 * 1024 * 1024)),
+            'range_threshold': int(converter_config.get('range_threshold', 256 * 1024 * 1024)),
+            'range_parts': int(converter_config.get('range_parts', 4)),
+            'resume_attempts': int(converter_config.get('resume_attempts', 3)),
+            'resolve_batch_size': int(converter_config.get('resolve_batch_size', 500)),
+            'url_cache_size': int(converter_config.get('url_cache_size', 10000)),
+            'query_batch_size': int(converter_config.get('query_batch_size', 1000)),
+            'commit_batch_size': int(converter_config.get('commit_batch_size', 500)),
+            'commit_interval': float(converter_config.get('commit_interval', 5)),
+            'checkpoint': bool(converter_config.get('checkpoint', True)),
+            'checkpoint_dir': converter_config.get('checkpoint_dir', 'checkpoints'),
+            'incremental': bool(converter_config.get('incremental', False)),
+            'upload_cache': bool(converter_config.get('upload_cache', True)),
+            'upload_cache_path': converter_config.get('upload_cache_path', 'cache/upload_cache.sqlite'),
+            'shards': int(converter_config.get('shards', 4)),
+            'shard_mode': converter_config.get('shard_mode', 'mod'),
+        }
+
 
 # 使用示例
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import asyncio
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+
+class Tracer:
+    """把每个阶段的耗时写成 Chrome trace 格式（JSON 数组），可用 chrome://tracing 或 Perfetto 打开"""
+
+    def __init__(self, path: str):
+        """
+        :param path: trace 文件路径
+        """
+        self.path = path
+        self.origin = time.monotonic()
+        self.pid = os.getpid()
+        self._file = None
+        self._first = True
+        # 线程或协程 -> 时间线上的行号
+        self._lanes = {}
+        # asyncio 任务结束后空出的行号，新任务优先复用最小的行号，行数不超过同时运行的任务数
+        self._free_lanes = []
+        self._lane_count = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write('[\n')
+        self.origin = time.monotonic()
+
+    def _lane(self) -> int:
+        """
+        当前执行单元在时间线上的行号：线程引擎中每个线程一行，
+        asyncio 引擎中所有协程在同一个线程里，改为每个任务一行，避免并发的阶段互相重叠；
+        任务结束（行的 row 阶段结束）后行号交还给后续的任务，长时间运行时行数不会无限增长
+        """
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            key = ('task', id(task))
+        else:
+            key = ('thread', threading.get_ident())
+        lane = self._lanes.get(key)
+        if lane is not None:
+            return lane
+        if task is not None and self._free_lanes:
+            lane = heapq.heappop(self._free_lanes)
+        else:
+            self._lane_count += 1
+            lane = self._lane_count
+            # 复用的行属于不同的任务，按行号命名
+            name = f'asyncio-{lane}' if task is not None else threading.current_thread().name
+            self._write({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': lane, 'args': {'name': name}})
+        self._lanes[key] = lane
+        if task is not None:
+            task.add_done_callback(lambda _: self._release(key))
+        return lane
+
+    def _release(self, key: tuple) -> None:
+        """任务结束后把它的行号放回空闲列表"""
+        with self._lock:
+            lane = self._lanes.pop(key, None)
+            if lane is not None:
+                heapq.heappush(self._free_lanes, lane)
+
+    def span(self, name: str, start: float, seconds: float, row_id: Any = None, size: int = 0,
+             error: bool = False) -> None:
+        """
+        记录一个已经结束的阶段
+        :param start: time.monotonic() 记录的开始时间
+        :param seconds: 耗时
+        :param row_id: 所属行的ID
+        :param size: 传输的字节数
+        :param error: 是否失败
+        """
+        args = {}
+        if row_id is not None:
+            args['row_id'] = row_id
+        if size:
+            args['bytes'] = size
+        if error:
+            args['error'] = True
+        with self._lock:
+            if self._file is None:
+                return
+            self._write({'name': name, 'ph': 'X', 'pid': self.pid, 'tid': self._lane(),
+                         'ts': round((start - self.origin) * 1e6), 'dur': round(seconds * 1e6), 'args': args})
+
+    def _write(self, event: dict) -> None:
+        if not self._first:
+            self._file.write(',\n')
+        self._first = False
+        self._file.write(json.dumps(event, ensure_ascii=False, default=str))
+
+    def close(self) -> Optional[str]:
+        """结束 JSON 数组并关闭文件，返回文件路径"""
+        with self._lock:
+            if self._file is None:
+                return None
+            self._file.write('\n]\n')
+            self._file.close()
+            self._file = None
+        return self.path
@@ -0,0 +1,46 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+
+class UploadCache:
+    """按 文件内容MD5 + 工作空间 + 上传目录 + 文件名 + 上传接口 记录上传结果的本地缓存，多个转换器和多次运行共用"""
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLite 文件路径
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        # 工作线程共用一个连接，由锁保证串行访问
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        # 上传结果中的 fileName 会写回源表，文件名不同的上传不能互相复用；
+        # 旧版本的 upload 表不区分文件名，不再使用
+        self.connection.execute('CREATE TABLE IF NOT EXISTS upload_file (md5 TEXT, space_id TEXT, path TEXT, '
+                                'file_name TEXT, original INTEGER, file_info TEXT, '
+                                'PRIMARY KEY (md5, space_id, path, file_name, original))')
+
+    def get(self, md5: str, space_id: int, upload_path: str, file_name: str, original: bool) -> Optional[dict]:
+        """查询相同内容是否已经以相同文件名、通过相同接口上传到同一位置，返回当时的文件信息"""
+        with self._lock:
+            cursor = self.connection.execute('SELECT file_info FROM upload_file WHERE md5 = ? AND space_id = ? '
+                                             'AND path = ? AND file_name = ? AND original = ?',
+                                             (md5, str(space_id), upload_path, file_name, int(original)))
+            result = cursor.fetchone()
+        return json.loads(result[0]) if result else None
+
+    def put(self, md5: str, space_id: int, upload_path: str, file_name: str, original: bool,
+            file_info: dict) -> None:
+        """记录上传结果"""
+        with self._lock:
+            self.connection.execute('INSERT OR REPLACE INTO upload_file (md5, space_id, path, file_name, original, '
+                                    'file_info) VALUES (?, ?, ?, ?, ?, ?)',
+                                    (md5, str(space_id), upload_path, file_name, int(original),
+                                     json.dumps(file_info)))
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
@@ -1,15 +1,68 @@
-import requests
+import os
+import uuid
+from typing import Iterable, Optional
+
+from utils.bandwidth import Bandwidth
+from utils.concurrency_limiter import AdaptiveLimiter
+from utils.http_session import SessionPool
+
+
+class MultipartStream:
+    """流式的 multipart/form-data 请求体，文件内容按块产生，不在内存中拼接整个请求体"""
+
+    def __init__(self, fields: dict, field_name: str, chunks: Iterable[bytes], length: Optional[int] = None):
+        """
+        :param fields: 普通表单字段
+        :param field_name: 上传时字段的名称
+        :param chunks: 文件内容的数据块
+        :param length: 文件内容的总长度，未知时使用 chunked 方式发送
+        """
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = ''
+        for name, value in fields.items():
+            head += f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        file_name = field_name.replace('"', '%22')
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n')
+        self.head = head.encode('utf-8')
+        self.tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self.chunks = chunks
+        self.length = length
+
+    def __len__(self):
+        # requests 根据长度设置 Content-Length，长度为 0 时改用 chunked
+        if self.length is None:
+            return 0
+        return len(self.head) + self.length + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        for chunk in self.chunks:
+            if chunk:
+                yield chunk
+        yield self.tail
 
 
 class FileUploader:
 
-    def __init__(self, url: str, original_url: str):
+    def __init__(self, url: str, original_url: str, chunk_size: int = 1024 * 1024,
+                 http: Optional[SessionPool] = None, limiter: Optional[AdaptiveLimiter] = None,
+                 bandwidth: Optional[Bandwidth] = None):
         """
         初始化上传模块
         :param url: 上传目标的URL地址
+        :param chunk_size: 上传时每次读取文件的字节数
+        :param http: 共享的 HTTP 连接池
+        :param limiter: 按 host 自适应调整并发数的限流器，未指定时不限制
+        :param bandwidth: 与下载共用的带宽限制，未指定时不限速
         """
         self.url = url
         self.original_url = original_url
+        self.chunk_size = chunk_size
+        self.http = http or SessionPool()
+        self.limiter = limiter or AdaptiveLimiter(enabled=False)
+        self.bandwidth = bandwidth or Bandwidth()
 
     def upload(self, space_id: int, file_path: str, field_name: str, upload_path: str, original: bool = False) -> dict:
         """
@@ -21,14 +74,35 @@ class FileUploader:
         :param upload_path: 上传的目标目录
         :return: 服务器的响应数据
         """
+        # 按 chunk_size 分块读取文件发送，内存占用与文件大小无关
         with open(file_path, 'rb') as file:
-            files = {'file': (field_name, file)}
-            data = {'spaceId': space_id, 'path': upload_path}
-            if original:
-                response = requests.post(self.original_url, files=files, data=data)
-            else:
-                response = requests.post(self.url, files=files, data=data)
-        # 检查响应状态
+            chunks = iter(lambda: file.read(self.chunk_size), b'')
+            return self.upload_stream(space_id, chunks, field_name, upload_path, original,
+                                      os.path.getsize(file_path))
+
+    def upload_stream(self, space_id: int, chunks: Iterable[bytes], field_name: str, upload_path: str,
+                      original: bool = False, length: Optional[int] = None) -> dict:
+        """
+        将数据块直接作为文件内容上传，不经过本地文件
+        :param space_id: 工作空间id
+        :param chunks: 文件内容的数据块，例如下载响应的 iter_content
+        :param field_name: 上传时字段的名称
+        :param upload_path: 上传的目标目录
+        :param original: 是否使用原始文件上传接口
+        :param length: 文件内容的总长度
+        :return: 服务器的响应数据
+        """
+        chunks = self.bandwidth.wrap(chunks, 'upload')
+        body = MultipartStream({'spaceId': space_id, 'path': upload_path}, field_name, chunks, length)
+        url = self.original_url if original else self.url
+        with self.limiter.slot(url) as slot:
+            response = self.http.post(url, data=body, headers={'Content-Type': body.content_type})
+            slot.observe(response, length)
+        return self._response_json(response)
+
+    @staticmethod
+    def _response_json(response) -> dict:
+        """检查响应状态并返回响应数据"""
         if response.status_code == 200:
             return response.json()
         else:
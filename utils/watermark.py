@@ -0,0 +1,32 @@
+import json
+import os
+from typing import Any, List, Optional, Tuple
+
+
+class Watermark:
+    """
+    增量运行的高水位：上次完整运行开始时数据库的时间，以及该次运行中失败、但之前已经迁移过的行，保存在 JSON 文件中
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: JSON 文件路径，每个转换器（分片）一个文件
+        """
+        self.path = path
+
+    def load(self) -> Tuple[Optional[str], List[Any]]:
+        """读取保存的时间和需要重试的行，没有运行过时返回 (None, [])"""
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None, []
+        return state.get('update_time'), state.get('retry_ids', [])
+
+    def save(self, update_time: str, retry_ids: List[Any]) -> None:
+        """先写入临时文件再替换，中断时不会留下不完整的文件"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'update_time': update_time, 'retry_ids': retry_ids}, file)
+        os.replace(tmp_path, self.path)